@@ -2,20 +2,25 @@ import warnings
 # Suppress FutureWarnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import logging
 from logging.handlers import RotatingFileHandler
 import threading
 import hmac
+import json
 from functools import wraps
 import main
 import process_state
+import disk_budget
+import job_store
+import metrics
 import config
 import os
 from werkzeug.utils import secure_filename
 from ssextractor import (
     get_or_create_drive_folder,
     validate_storage_health,
+    get_storage_user_suffix,
     DEFAULT_ARCHIVE_DRIVE_ROOT_FOLDER_ID,
 )
 from archive_settings import (
@@ -40,6 +45,13 @@ def log(message):
     logger.info(message)
 
 
+# A comment line is sent this often on an idle status stream so proxies keep it open and
+# a client that went away is noticed.
+STREAM_KEEPALIVE_SECONDS = 15
+_open_streams_lock = threading.Lock()
+_open_streams = 0
+
+
 def enforce_startup_health_check():
     try:
         validate_storage_health()
@@ -48,6 +60,24 @@ def enforce_startup_health_check():
         raise SystemExit(f"Startup health check failed: {exc}") from exc
 
 
+def _job_owner(job_credentials):
+    token = config.set_thread_credentials(job_credentials)
+    try:
+        return get_storage_user_suffix()
+    finally:
+        config.reset_thread_credentials(token)
+
+
+def _resume_error(resume_job_id, stored_job, job_credentials):
+    if not stored_job:
+        return f"Job {resume_job_id} was not found in the job store."
+    if process_state.is_job_active(resume_job_id):
+        return f"Job {resume_job_id} is still running."
+    if stored_job["owner"] != _job_owner(job_credentials):
+        return f"Job {resume_job_id} was started with a different Smartsheet API key."
+    return None
+
+
 def _is_admin_authorized(username, password):
     expected_username = config.CREDENTIALS.get("ADMIN_USERNAME") or "admin"
     expected_password = config.CREDENTIALS.get("ADMIN_PASSWORD") or "admin"
@@ -90,6 +120,7 @@ def index():
             "GOOGLE_DRIVE__COMMENTS_FOLDER_ID": request.form.get('google_drive_comments_folder_id'),
             "GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID": request.form.get('google_drive_attachments_folder_id'),
             "GOOGLE_AUTH_TYPE": request.form.get('google_auth_type') or config.CREDENTIALS.get("GOOGLE_AUTH_TYPE"),
+            "ATTACHMENT_DOWNLOAD_WORKERS": request.form.get('attachment_download_workers'),
         }
 
         # Update job configuration, but do not overwrite existing values with None/empty strings
@@ -97,6 +128,20 @@ def index():
             if value:
                 job_credentials[key] = value
 
+        # A full backup re-processes every sheet even if it is unchanged since the last run
+        if request.form.get('full_backup'):
+            job_credentials["INCREMENTAL_BACKUP"] = "false"
+
+        # Resuming an interrupted job keeps its ID, source folder and Drive destination
+        resume_job_id = (request.form.get('resume_job_id') or "").strip()
+        if resume_job_id:
+            stored_job = job_store.get_job(resume_job_id)
+            resume_error = _resume_error(resume_job_id, stored_job, job_credentials)
+            if resume_error:
+                log(resume_error)
+                return render_template('index.html', error_message=resume_error)
+            job_credentials.update(stored_job["settings"])
+
         # Handle OAuth client secret upload (required when using OAuth)
         oauth_client_upload = request.files.get('google_oauth_client_secret_upload')
         if oauth_client_upload and oauth_client_upload.filename:
@@ -145,8 +190,11 @@ def index():
             if 'token' in locals():
                 config.reset_thread_credentials(token)
 
-        job_id = process_state.create_job()
+        job_id = process_state.create_job(job_id=resume_job_id or None)
         job_credentials["JOB_ID"] = job_id
+        if resume_job_id:
+            job_credentials["RESUME_JOB"] = "true"
+            log(f"Resuming job {job_id}.")
         # Start migration in a background thread
         log("Starting migration thread.")
         threading.Thread(
@@ -201,11 +249,105 @@ def status():
     job_id = request.args.get("job_id")
     if not job_id:
         return jsonify({"error": "job_id is required"}), 400
-    status = process_state.get_status(job_id)
+    # Jobs from before a restart are only in the job store
+    status = process_state.get_status(job_id) or job_store.get_job_status(job_id)
     if not status:
         return jsonify({"error": "job not found"}), 404
+    status["temp_disk_usage"] = disk_budget.job_usage(job_id)
     return jsonify(status)
 
+def _sse_event(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def _release_stream():
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams -= 1
+
+
+def _job_event_stream(job_id, last_event_id):
+    """
+    Server-sent events for one job: a `snapshot` of the whole status first (or whenever the client
+    fell behind the event buffer), then only the `status`, `sheets` and `sheet` deltas.
+    The stream ends once the job has stopped running.
+    """
+    cursor = last_event_id
+    yield "retry: 3000\n\n"
+    while True:
+        if cursor is None:
+            snapshot = process_state.status_snapshot(job_id)
+            if snapshot is None:
+                return
+            cursor, status = snapshot
+            status["temp_disk_usage"] = disk_budget.job_usage(job_id)
+            yield _sse_event(cursor, "snapshot", status)
+            if not status["running"]:
+                return
+        result = process_state.wait_for_events(job_id, cursor, STREAM_KEEPALIVE_SECONDS)
+        if result is None:
+            return
+        events, missed = result
+        if missed:
+            cursor = None
+            continue
+        if not events:
+            if not process_state.is_job_active(job_id):
+                return
+            yield ": keepalive\n\n"
+            continue
+        for event_id, event_type, data in events:
+            yield _sse_event(event_id, event_type, data)
+            cursor = event_id
+            if data.get("running") is False:
+                return
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Push-based alternative to polling /status; browsers reconnect with Last-Event-ID."""
+    global _open_streams
+    job_id = request.args.get("job_id")
+    if not job_id:
+        return jsonify({"error": "job_id is required"}), 400
+    if process_state.get_status(job_id) is None:
+        # Jobs from before a restart have nothing left to stream; /status answers for them.
+        if job_store.get_job(job_id):
+            return jsonify({"error": "job is not running in this process; use /status"}), 404
+        return jsonify({"error": "job not found"}), 404
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    # Each open stream holds a server thread, so their number is capped; clients over the cap poll.
+    with _open_streams_lock:
+        if _open_streams >= config.get_int_credential("STATUS_STREAM_MAX_CLIENTS", 32, minimum=1):
+            return jsonify({"error": "too many open status streams; poll /status instead"}), 503
+        _open_streams += 1
+    response = Response(
+        _job_event_stream(job_id, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(_release_stream)
+    return response
+
+@app.route('/jobs', methods=['GET'])
+@require_admin_auth
+def jobs():
+    """Recent jobs from the job store; an interrupted one can be resumed from the start form."""
+    stored_jobs = job_store.list_jobs()
+    for job in stored_jobs:
+        job["interrupted"] = job["running"] and not process_state.is_job_active(job["job_id"])
+    return jsonify({"jobs": stored_jobs})
+
+@app.route('/metrics', methods=['GET'])
+@require_admin_auth
+def prometheus_metrics():
+    """Stage, API, transfer and queue metrics in the Prometheus text format (admin only: series carry job IDs)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/cancel', methods=['POST'])
 def cancel():
     job_id = request.args.get("job_id")
@@ -219,4 +361,5 @@ if __name__ == '__main__':
     from waitress import serve
     enforce_startup_health_check()
     log("Starting production server on port 5000...")
-    serve(app, host='0.0.0.0', port=5000)
+    # Status streams hold a thread each, on top of the threads that serve ordinary requests.
+    serve(app, host='0.0.0.0', port=5000, threads=config.get_int_credential("HTTP_SERVER_THREADS", 48, minimum=4))
@@ -35,6 +35,58 @@ CREDENTIALS = {
     ),
     "GOOGLE_OAUTH_CLIENT_SECRET_FILE": os.getenv("GOOGLE_OAUTH_CLIENT_SECRET_FILE", "client_secret.json"),
     "GOOGLE_OAUTH_TOKEN_FILE": os.getenv("GOOGLE_OAUTH_TOKEN_FILE", "token.json"),
+    # Alternative API hosts; unset in production, pointed at local stand-ins by the benchmark in bench/
+    "SMARTSHEET_API_BASE": os.getenv("SMARTSHEET_API_BASE"),
+    "GOOGLE_API_ROOT_URL": os.getenv("GOOGLE_API_ROOT_URL"),
+    # Migration tuning
+    # SHEET_WORKER_COUNT: number of sheets processed at the same time within one job
+    "SHEET_WORKER_COUNT": os.getenv("SHEET_WORKER_COUNT", "2"),
+    # SHEET_EXECUTION_MODE: "pipeline" (fetch/transform/upload overlap across sheets) or "pool"
+    "SHEET_EXECUTION_MODE": os.getenv("SHEET_EXECUTION_MODE", "pipeline"),
+    # SHEET_PIPELINE_MAX_STAGED: sheets allowed to hold local files at once in pipeline mode
+    "SHEET_PIPELINE_MAX_STAGED": os.getenv("SHEET_PIPELINE_MAX_STAGED", "3"),
+    # INCREMENTAL_BACKUP: skip sheets whose version is unchanged since their last completed backup
+    "INCREMENTAL_BACKUP": os.getenv("INCREMENTAL_BACKUP", "true"),
+    "SHEET_MANIFEST_FILE": os.getenv("SHEET_MANIFEST_FILE", "sheet_manifest.json"),
+    # SQLite (WAL) store of jobs, per-sheet stage checkpoints and uploaded Drive file IDs, used to resume jobs
+    "JOB_STORE_FILE": os.getenv("JOB_STORE_FILE", "job_store.db"),
+    # Live status: status deltas kept per job for /events, open event streams, and web server threads
+    "JOB_EVENT_BUFFER_SIZE": os.getenv("JOB_EVENT_BUFFER_SIZE", "1000"),
+    "STATUS_STREAM_MAX_CLIENTS": os.getenv("STATUS_STREAM_MAX_CLIENTS", "32"),
+    "HTTP_SERVER_THREADS": os.getenv("HTTP_SERVER_THREADS", "48"),
+    # Smartsheet API budget shared by all threads and jobs using the same API key
+    "SMARTSHEET_REQUESTS_PER_MINUTE": os.getenv("SMARTSHEET_REQUESTS_PER_MINUTE", "300"),
+    # Connection pools: the shared Smartsheet client per API key, and the pre-signed attachment URL session
+    "SMARTSHEET_HTTP_POOL_SIZE": os.getenv("SMARTSHEET_HTTP_POOL_SIZE", "16"),
+    "ATTACHMENT_HTTP_POOL_SIZE": os.getenv("ATTACHMENT_HTTP_POOL_SIZE", "32"),
+    # SMARTSHEET_MAX_RETRIES: retries for 429 (honouring Retry-After) and transient 5xx responses
+    "SMARTSHEET_MAX_RETRIES": os.getenv("SMARTSHEET_MAX_RETRIES", "6"),
+    # ATTACHMENT_DOWNLOAD_WORKERS: concurrent attachment downloads per sheet
+    "ATTACHMENT_DOWNLOAD_WORKERS": os.getenv("ATTACHMENT_DOWNLOAD_WORKERS", "4"),
+    # ATTACHMENT_TRANSFER_MODE: "disk" (download, then upload) or "stream" (pipe each download into Drive)
+    "ATTACHMENT_TRANSFER_MODE": os.getenv("ATTACHMENT_TRANSFER_MODE", "disk"),
+    # tempData disk budget: 0 MB = no budget; TEMP_DISK_FULL_POLICY "pause" (wait for space) or "stream"
+    "TEMP_DISK_BUDGET_MB": os.getenv("TEMP_DISK_BUDGET_MB", "0"),
+    "TEMP_DISK_MIN_FREE_MB": os.getenv("TEMP_DISK_MIN_FREE_MB", "1024"),
+    "TEMP_DISK_FULL_POLICY": os.getenv("TEMP_DISK_FULL_POLICY", "pause"),
+    "TEMP_DISK_PAUSE_TIMEOUT_SECONDS": os.getenv("TEMP_DISK_PAUSE_TIMEOUT_SECONDS", "300"),
+    # ATTACHMENT_DISCOVERY_MODE: "sheet" (bulk sheet-level listing) or "row" (one call per row)
+    "ATTACHMENT_DISCOVERY_MODE": os.getenv("ATTACHMENT_DISCOVERY_MODE", "sheet"),
+    # SHEET_PREPARE_MODE: "auto", "dataframe" or "streaming" (row-by-row, flat memory)
+    "SHEET_PREPARE_MODE": os.getenv("SHEET_PREPARE_MODE", "auto"),
+    "SHEET_STREAMING_ROW_THRESHOLD": os.getenv("SHEET_STREAMING_ROW_THRESHOLD", "20000"),
+    # Drive uploads: files at or above the threshold use resumable, chunked sessions
+    "DRIVE_RESUMABLE_THRESHOLD_MB": os.getenv("DRIVE_RESUMABLE_THRESHOLD_MB", "5"),
+    "DRIVE_UPLOAD_CHUNK_MB": os.getenv("DRIVE_UPLOAD_CHUNK_MB", "8"),
+    "DRIVE_UPLOAD_MAX_RETRIES": os.getenv("DRIVE_UPLOAD_MAX_RETRIES", "5"),
+    # Adaptive (AIMD) Drive upload concurrency per credential: starts at START, grows up to MAX
+    "DRIVE_UPLOAD_START_CONCURRENCY": os.getenv("DRIVE_UPLOAD_START_CONCURRENCY", "4"),
+    "DRIVE_UPLOAD_MAX_CONCURRENCY": os.getenv("DRIVE_UPLOAD_MAX_CONCURRENCY", "16"),
+    # Process-wide Drive folder ID cache
+    "DRIVE_FOLDER_CACHE_SIZE": os.getenv("DRIVE_FOLDER_CACHE_SIZE", "10000"),
+    "DRIVE_FOLDER_CACHE_TTL_SECONDS": os.getenv("DRIVE_FOLDER_CACHE_TTL_SECONDS", "86400"),
+    # DRIVE_DIAGNOSTICS: log parent/created folder metadata on every folder lookup (slow)
+    "DRIVE_DIAGNOSTICS": os.getenv("DRIVE_DIAGNOSTICS", "false"),
 }
 
 _CREDENTIALS_CTX = contextvars.ContextVar("credentials_override", default=None)
@@ -49,6 +101,28 @@ def get_credential(key, default=None):
     return get_credentials().get(key, default)
 
 
+def get_bool_credential(key, default=False):
+    """Read a true/false setting ("1", "true", "yes", "on" are true)."""
+    raw_value = get_credential(key)
+    if raw_value is None or str(raw_value).strip() == "":
+        return default
+    if isinstance(raw_value, bool):
+        return raw_value
+    return str(raw_value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_int_credential(key, default, minimum=None):
+    """Read an integer setting, falling back to the default when unset or invalid."""
+    raw_value = get_credential(key)
+    try:
+        value = int(str(raw_value).strip())
+    except (TypeError, ValueError):
+        value = default
+    if minimum is not None and value < minimum:
+        value = minimum
+    return value
+
+
 def set_thread_credentials(creds):
     return _CREDENTIALS_CTX.set(creds)
 
@@ -0,0 +1,153 @@
+import shutil
+import threading
+import time
+
+import config
+import process_state
+
+MB = 1024 * 1024
+# Reserved for a file whose size is not known up front (no Content-Length or size hint).
+UNKNOWN_SIZE_RESERVATION = 64 * MB
+
+_BUDGET_CONDITION = threading.Condition()
+_USAGE = {}  # job_id -> {sheet_id: staged bytes}
+_PENDING = {}  # job_id -> {sheet_id: reserved bytes not written yet}
+_DOWNLOADS_DONE = set()  # (job_id, sheet_id) of sheets past their download stage
+
+
+def _limits():
+    budget_mb = config.get_int_credential("TEMP_DISK_BUDGET_MB", 0, minimum=0)
+    min_free_mb = config.get_int_credential("TEMP_DISK_MIN_FREE_MB", 1024, minimum=0)
+    return (budget_mb * MB or None), min_free_mb * MB
+
+
+def _used_unlocked():
+    return sum(sum(sheets.values()) for sheets in _USAGE.values())
+
+
+def _pending_unlocked():
+    return sum(sum(sheets.values()) for sheets in _PENDING.values())
+
+
+def _fits_unlocked(nbytes, base_dir):
+    budget, min_free = _limits()
+    if budget is not None and _used_unlocked() + nbytes > budget:
+        return False
+    # Space reserved by other writers is not on disk yet, so the volume's free space still counts it.
+    return shutil.disk_usage(base_dir).free - _pending_unlocked() - nbytes >= min_free
+
+
+def _add_unlocked(job_id, sheet_id, nbytes, usage=_USAGE):
+    sheets = usage.setdefault(str(job_id), {})
+    sheets[str(sheet_id)] = max(sheets.get(str(sheet_id), 0) + nbytes, 0)
+
+
+def _releasable_unlocked():
+    """Staged bytes held by sheets that have finished downloading, which cleanup will free without needing more."""
+    return sum(
+        nbytes
+        for job_id, sheets in _USAGE.items()
+        for sheet_id, nbytes in sheets.items()
+        if (job_id, sheet_id) in _DOWNLOADS_DONE
+    )
+
+
+def reservation_size(nbytes):
+    """Bytes to reserve for a file of `nbytes`; unknown sizes (0 or None) get UNKNOWN_SIZE_RESERVATION."""
+    return nbytes if nbytes and nbytes > 0 else UNKNOWN_SIZE_RESERVATION
+
+
+def check_free_space(base_dir):
+    """Raise RuntimeError when the staging volume has less than TEMP_DISK_MIN_FREE_MB free."""
+    _, min_free = _limits()
+    free = shutil.disk_usage(base_dir).free
+    if free < min_free:
+        raise RuntimeError(
+            f"Only {free // MB} MB free under {base_dir}; at least {min_free // MB} MB "
+            "(TEMP_DISK_MIN_FREE_MB) is required for staging."
+        )
+    return free
+
+
+def reserve(job_id, sheet_id, nbytes, base_dir, *, wait=True):
+    """
+    Reserve `nbytes` of staging space for a sheet before writing it; settle() it once the file is
+    written or abandoned. With `wait`, blocks while
+    sheets that are past their download stage hold space they will free on cleanup, for at most
+    TEMP_DISK_PAUSE_TIMEOUT_SECONDS. Sheets still downloading are never waited on: two of them
+    waiting for each other's space would never finish. Returns False when the space cannot be had:
+    budget or free space exhausted and nothing to wait for, the wait timed out, or the job cancelled.
+    """
+    deadline = time.monotonic() + config.get_int_credential("TEMP_DISK_PAUSE_TIMEOUT_SECONDS", 300, minimum=0)
+    with _BUDGET_CONDITION:
+        while True:
+            if _fits_unlocked(nbytes, base_dir):
+                _add_unlocked(job_id, sheet_id, nbytes)
+                _add_unlocked(job_id, sheet_id, nbytes, _PENDING)
+                return True
+            remaining = deadline - time.monotonic()
+            if not wait or remaining <= 0 or _releasable_unlocked() <= 0:
+                return False
+            if process_state.is_cancel_requested(job_id):
+                return False
+            _BUDGET_CONDITION.wait(timeout=min(remaining, 1.0))
+
+
+def charge(job_id, sheet_id, nbytes):
+    """Account for bytes already written (or, when negative, removed) without waiting."""
+    with _BUDGET_CONDITION:
+        _add_unlocked(job_id, sheet_id, nbytes)
+        if nbytes < 0:
+            _BUDGET_CONDITION.notify_all()
+
+
+def finish_downloads(job_id, sheet_id):
+    """Mark a sheet as past its download stage, so other sheets may wait for the space it holds."""
+    with _BUDGET_CONDITION:
+        _DOWNLOADS_DONE.add((str(job_id), str(sheet_id)))
+        _BUDGET_CONDITION.notify_all()
+
+
+def settle(job_id, sheet_id, reserved, written):
+    """Replace a reservation with the bytes actually written (0 when the file was dropped)."""
+    with _BUDGET_CONDITION:
+        _add_unlocked(job_id, sheet_id, -reserved, _PENDING)
+        _add_unlocked(job_id, sheet_id, written - reserved)
+        _BUDGET_CONDITION.notify_all()
+
+
+def release_sheet(job_id, sheet_id):
+    """Drop everything accounted to a sheet once its temp folders are removed."""
+    with _BUDGET_CONDITION:
+        for usage in (_USAGE, _PENDING):
+            sheets = usage.get(str(job_id))
+            if sheets is not None:
+                sheets.pop(str(sheet_id), None)
+                if not sheets:
+                    usage.pop(str(job_id), None)
+        _DOWNLOADS_DONE.discard((str(job_id), str(sheet_id)))
+        _BUDGET_CONDITION.notify_all()
+
+
+def wait_for_headroom(job_id, base_dir, fraction=0.9):
+    """
+    Block a new sheet from starting while staging is above `fraction` of the budget (or the
+    free-space floor) and other sheets can still free space. Returns False if the job is cancelled.
+    """
+    budget, min_free = _limits()
+    with _BUDGET_CONDITION:
+        while True:
+            used = _used_unlocked()
+            within_budget = budget is None or used < budget * fraction
+            if (within_budget and shutil.disk_usage(base_dir).free >= min_free) or used <= 0:
+                return True
+            if process_state.is_cancel_requested(job_id):
+                return False
+            _BUDGET_CONDITION.wait(timeout=1.0)
+
+
+def job_usage(job_id):
+    """Staged bytes of a job, in total and per sheet."""
+    with _BUDGET_CONDITION:
+        sheets = dict(_USAGE.get(str(job_id), {}))
+    return {"total": sum(sheets.values()), "sheets": sheets}
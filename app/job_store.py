@@ -0,0 +1,276 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import config
+
+# Job settings that are safe to keep on disk and are needed to resume a job (secrets are re-entered).
+RESUME_SETTING_KEYS = (
+    "SMARTSHEET_FOLDER_ID",
+    "GOOGLE_DRIVE_PARENT_FOLDER_ID",
+    "GOOGLE_DRIVE_SHEETS_FOLDER_ID",
+    "GOOGLE_DRIVE__COMMENTS_FOLDER_ID",
+    "GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID",
+    "GOOGLE_DRIVE_ARCHIVE_ROOT_FOLDER_ID",
+    "GOOGLE_AUTH_TYPE",
+    "ATTACHMENT_DOWNLOAD_WORKERS",
+    "INCREMENTAL_BACKUP",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    owner TEXT,
+    settings TEXT,
+    running INTEGER,
+    progress TEXT,
+    details TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    job_id TEXT,
+    sheet_id TEXT,
+    state TEXT,
+    details TEXT,
+    version INTEGER,
+    updated_at TEXT,
+    PRIMARY KEY (job_id, sheet_id)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    job_id TEXT,
+    sheet_id TEXT,
+    stage TEXT,
+    completed_at TEXT,
+    PRIMARY KEY (job_id, sheet_id, stage)
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id TEXT,
+    sheet_id TEXT,
+    kind TEXT,
+    file_key TEXT,
+    drive_file_id TEXT,
+    record TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (job_id, sheet_id, kind, file_key)
+);
+"""
+
+_STORE_LOCK = threading.RLock()
+_CONNECTIONS = {}
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _store_file_path() -> Path:
+    raw_path = config.CREDENTIALS.get("JOB_STORE_FILE") or "job_store.db"
+    return Path(raw_path)
+
+
+def _connection_unlocked():
+    store_path = _store_file_path()
+    connection = _CONNECTIONS.get(str(store_path))
+    if connection is None:
+        store_path.parent.mkdir(parents=True, exist_ok=True)
+        # One shared connection guarded by _STORE_LOCK; WAL keeps readers off the writer's back.
+        connection = sqlite3.connect(str(store_path), check_same_thread=False, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        _CONNECTIONS[str(store_path)] = connection
+    return connection
+
+
+def _write(statements):
+    """Run (sql, params) pairs in one transaction. A failing store never stops the migration itself."""
+    with _STORE_LOCK:
+        try:
+            connection = _connection_unlocked()
+            with connection:
+                for sql, params in statements:
+                    connection.execute(sql, params)
+            return True
+        except (sqlite3.Error, OSError) as exc:
+            print(f"Job store write failed: {exc}")
+            return False
+
+
+def _read(sql, params=()):
+    with _STORE_LOCK:
+        try:
+            return _connection_unlocked().execute(sql, params).fetchall()
+        except (sqlite3.Error, OSError) as exc:
+            print(f"Job store read failed: {exc}")
+            return []
+
+
+def save_job_status(job_id, status):
+    """Upsert the job-level fields of a process_state status dict."""
+    _write([(
+        "INSERT INTO jobs (job_id, running, progress, details, started_at, finished_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(job_id) DO UPDATE SET running=excluded.running, "
+        "progress=excluded.progress, details=excluded.details, finished_at=excluded.finished_at, "
+        "updated_at=excluded.updated_at",
+        (
+            job_id,
+            int(bool(status.get("running"))),
+            status.get("progress"),
+            status.get("details"),
+            status.get("started_at"),
+            status.get("finished_at"),
+            _now_iso(),
+        ),
+    )])
+
+
+def save_job_settings(job_id, owner, job_credentials):
+    """Keep the non-secret settings a resumed run must reuse (same source folder and Drive destination)."""
+    settings = {key: job_credentials.get(key) for key in RESUME_SETTING_KEYS if job_credentials.get(key)}
+    _write([
+        ("INSERT OR IGNORE INTO jobs (job_id, updated_at) VALUES (?, ?)", (job_id, _now_iso())),
+        ("UPDATE jobs SET owner = ?, settings = ? WHERE job_id = ?", (owner, json.dumps(settings), job_id)),
+    ])
+
+
+def get_job(job_id):
+    """Return the stored job row (owner, settings, last status) as a dict, or None."""
+    rows = _read("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+    if not rows:
+        return None
+    job = dict(rows[0])
+    job["settings"] = json.loads(job["settings"] or "{}")
+    job["running"] = bool(job["running"])
+    return job
+
+
+def list_jobs(limit=50):
+    """Most recently updated jobs, without their settings."""
+    rows = _read(
+        "SELECT job_id, owner, running, progress, started_at, finished_at, updated_at "
+        "FROM jobs ORDER BY updated_at DESC LIMIT ?",
+        (limit,),
+    )
+    return [dict(row, running=bool(row["running"])) for row in rows]
+
+
+def get_job_status(job_id):
+    """
+    Rebuild a status dict (same shape as process_state.get_status) for a job that is not in memory.
+    A job stored as running was interrupted by a restart and is reported as such.
+    """
+    job = get_job(job_id)
+    if not job:
+        return None
+    sheets = {
+        row["sheet_id"]: {"state": row["state"], "details": row["details"] or "", "updated_at": row["updated_at"]}
+        for row in _read("SELECT sheet_id, state, details, updated_at FROM sheets WHERE job_id = ?", (job_id,))
+    }
+    states = [result["state"] for result in sheets.values()]
+    return {
+        "running": False,
+        "interrupted": job["running"],
+        "progress": "Interrupted; resume to continue" if job["running"] else job["progress"],
+        "details": job["details"] or "",
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "sheets_total": len(states),
+        "sheets_completed": states.count("completed"),
+        "sheets_failed": states.count("failed"),
+        "sheets_cancelled": states.count("cancelled"),
+        "sheets_skipped": states.count("skipped"),
+        "sheets": sheets,
+    }
+
+
+def init_sheets(job_id, sheet_ids):
+    """Mark every sheet of a run as queued, keeping the checkpoints of sheets seen by an earlier run."""
+    now = _now_iso()
+    _write([
+        (
+            "INSERT INTO sheets (job_id, sheet_id, state, details, updated_at) VALUES (?, ?, 'queued', '', ?) "
+            "ON CONFLICT(job_id, sheet_id) DO UPDATE SET state='queued', details='', updated_at=excluded.updated_at",
+            (job_id, str(sheet_id), now),
+        )
+        for sheet_id in sheet_ids
+    ])
+
+
+def record_sheet(job_id, sheet_id, state, details=""):
+    _write([(
+        "INSERT INTO sheets (job_id, sheet_id, state, details, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(job_id, sheet_id) DO UPDATE SET state=excluded.state, details=excluded.details, "
+        "updated_at=excluded.updated_at",
+        (job_id, str(sheet_id), state, details or "", _now_iso()),
+    )])
+
+
+def completed_sheets(job_id):
+    """IDs of the sheets a job has already completed."""
+    return {
+        row["sheet_id"]
+        for row in _read("SELECT sheet_id FROM sheets WHERE job_id = ? AND state = 'completed'", (job_id,))
+    }
+
+
+def begin_sheet(job_id, sheet_id, version):
+    """
+    Register the sheet version a run is about to back up and return the checkpoint left by an
+    earlier run of the same job: completed stages, Drive file IDs by path relative to the resource
+    root, and synced attachment records. A changed version discards the old checkpoint.
+    """
+    sheet_id = str(sheet_id)
+    rows = _read("SELECT version FROM sheets WHERE job_id = ? AND sheet_id = ?", (job_id, sheet_id))
+    stored_version = rows[0]["version"] if rows else None
+    if stored_version is not None and stored_version != version:
+        _write([
+            ("DELETE FROM stages WHERE job_id = ? AND sheet_id = ?", (job_id, sheet_id)),
+            ("DELETE FROM files WHERE job_id = ? AND sheet_id = ?", (job_id, sheet_id)),
+        ])
+    _write([(
+        "INSERT INTO sheets (job_id, sheet_id, state, details, version, updated_at) VALUES (?, ?, 'queued', '', ?, ?) "
+        "ON CONFLICT(job_id, sheet_id) DO UPDATE SET version=excluded.version",
+        (job_id, sheet_id, version, _now_iso()),
+    )])
+
+    checkpoint = {"stages": set(), "drive_files": {}, "attachments": {}}
+    for row in _read("SELECT stage FROM stages WHERE job_id = ? AND sheet_id = ?", (job_id, sheet_id)):
+        checkpoint["stages"].add(row["stage"])
+    for row in _read(
+        "SELECT kind, file_key, drive_file_id, record FROM files WHERE job_id = ? AND sheet_id = ?",
+        (job_id, sheet_id),
+    ):
+        if row["kind"] == "attachment":
+            checkpoint["attachments"][row["file_key"]] = json.loads(row["record"] or "{}")
+        else:
+            checkpoint["drive_files"][row["file_key"]] = row["drive_file_id"]
+    return checkpoint
+
+
+def record_stage(job_id, sheet_id, stage):
+    _write([(
+        "INSERT OR REPLACE INTO stages (job_id, sheet_id, stage, completed_at) VALUES (?, ?, ?, ?)",
+        (job_id, str(sheet_id), stage, _now_iso()),
+    )])
+
+
+def record_drive_file(job_id, sheet_id, file_key, drive_file_id):
+    _write([(
+        "INSERT OR REPLACE INTO files (job_id, sheet_id, kind, file_key, drive_file_id, record, updated_at) "
+        "VALUES (?, ?, 'drive_file', ?, ?, NULL, ?)",
+        (job_id, str(sheet_id), file_key, drive_file_id, _now_iso()),
+    )])
+
+
+def record_attachment(job_id, sheet_id, record):
+    """Persist a synced attachment record (attachment ID, name, size, row and Drive file ID)."""
+    _write([(
+        "INSERT OR REPLACE INTO files (job_id, sheet_id, kind, file_key, drive_file_id, record, updated_at) "
+        "VALUES (?, ?, 'attachment', ?, ?, ?, ?)",
+        (job_id, str(sheet_id), record["attachment_id"], record.get("drive_file_id"), json.dumps(record), _now_iso()),
+    )])
@@ -1,6 +1,9 @@
 import os
 import logging
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import process_state
 from ssextractor import (
     download_smartsheet_as_excel,
@@ -17,9 +20,22 @@ from ssextractor import (
     access_config_file,
     get_smartsheet_client,
     validate_storage_health,
+    get_sheet_state,
+    get_storage_user_suffix,
+    fetch_sheet_version,
+    get_backup_destination,
+    get_recorded_drive_files,
+    get_attachment_sync_result,
+    get_failed_stages,
+    get_base_dir,
+    restore_sheet_checkpoint,
 )
+import disk_budget
+import job_store
+import metrics
 from getSsSheetID import get_sheets_in_folder
 import config
+import sheet_manifest
 
 logger = logging.getLogger("smartsheet_migrator")
 
@@ -28,6 +44,360 @@ def log(message):
 
 
 
+# Stages are grouped by the resource they use so the pipeline can overlap them across sheets:
+# fetch talks to Smartsheet, transform is local CPU/disk, upload talks to Google Drive.
+SHEET_STAGE_GROUPS = [
+    ("fetch", [
+        ("download", download_smartsheet_as_excel),
+        ("attachments", download_smartsheet_attachments),
+    ]),
+    ("transform", [
+        ("comments", extract_and_store_comments),
+        ("row_mapping", create_relative_row_mapping),
+        ("merge_comments", merge_comments_with_row_mapping),
+        ("prepare_sheet", prepare_sheet_for_drive_upload),
+    ]),
+    ("upload", [
+        ("upload_sheet", upload_to_google_drive),
+        ("upload_comments", upload_comments_to_drive),
+        ("upload_attachments", upload_attachments_to_drive),
+        ("upload_archive", upload_archive_copy_to_drive),
+    ]),
+]
+SHEET_STAGES = [step for _, steps in SHEET_STAGE_GROUPS for step in steps]
+# Stages whose checkpoint means their output is complete in Drive, so a resumed job does not run them again.
+# Attachment uploads resume per file instead (synced attachments are not transferred twice).
+RESUMABLE_STAGES = {"upload_sheet", "upload_comments", "upload_archive"}
+
+_PIPELINE_DONE = object()
+
+
+def _run_stage(job_id, sheet_id, stage_name, stage):
+    """Run one stage function with its duration, outcome and active-worker metrics recorded."""
+    stage_token = metrics.set_stage(stage_name)
+    started = time.monotonic()
+    outcome = "failed"
+    try:
+        with metrics.track_active(stage_name):
+            result = stage(sheet_id)
+        if process_state.is_cancel_requested():
+            outcome = "cancelled"
+        elif stage_name not in get_failed_stages(sheet_id) and (stage_name != "upload_sheet" or result is not None):
+            outcome = "ok"
+        return result
+    finally:
+        metrics.STAGE_DURATION.observe(time.monotonic() - started, job=job_id, stage=stage_name)
+        metrics.STAGE_RUNS.inc(job=job_id, stage=stage_name, outcome=outcome)
+        metrics.reset_stage(stage_token)
+
+
+def _run_sheet_steps(sheet_id, steps):
+    """
+    Runs stage functions in order and checkpoints each finished stage in the job store.
+    Returns None unless the sheet cannot go on, else a (state, details) tuple. Stages that fail
+    without stopping the sheet are not checkpointed; record_completed_sheet reports them.
+    """
+    job_id = config.get_credential("JOB_ID")
+    resumed_stages = get_sheet_state(sheet_id).get("resumed_stages", set())
+    for stage_name, stage in steps:
+        if stage_name in resumed_stages:
+            log(f"Sheet {sheet_id}: {stage_name} already done before the job was resumed.")
+            continue
+        result = _run_stage(job_id, sheet_id, stage_name, stage)
+        if process_state.is_cancel_requested():
+            return "cancelled", f"Cancelled after {stage_name}"
+        if stage_name == "upload_sheet" and not result:
+            return "failed", "Sheet export was not uploaded to Drive"
+        if stage_name in get_failed_stages(sheet_id):
+            continue
+        if stage_name not in RESUMABLE_STAGES or result is not None:
+            job_store.record_stage(job_id, sheet_id, stage_name)
+    return None
+
+
+def load_sheet_checkpoints(job_id, sheet_ids):
+    """
+    Register each sheet's version with the job store and restore what an earlier run of the same
+    job already finished for that version (a new job simply starts with empty checkpoints).
+    """
+    for sheet_id in sheet_ids:
+        source = get_sheet_state(sheet_id).get("source_version") or {}
+        checkpoint = job_store.begin_sheet(job_id, sheet_id, source.get("version"))
+        if not (checkpoint["stages"] or checkpoint["drive_files"] or checkpoint["attachments"]):
+            continue
+        restore_sheet_checkpoint(sheet_id, checkpoint)
+        get_sheet_state(sheet_id)["resumed_stages"] = checkpoint["stages"] & RESUMABLE_STAGES
+        log(
+            f"Sheet {sheet_id}: resuming with {len(checkpoint['stages'])} finished stage(s) and "
+            f"{len(checkpoint['attachments'])} synced attachment(s)."
+        )
+
+
+def select_sheets_to_back_up(job_id, client, sheets):
+    """
+    Reads each sheet's version and, when INCREMENTAL_BACKUP is on, skips sheets whose last backup
+    completed for the same version and Drive destination. Returns the IDs of the sheets to process.
+    """
+    incremental = config.get_bool_credential("INCREMENTAL_BACKUP", True)
+    owner = get_storage_user_suffix()
+    destination = get_backup_destination()
+    sheet_ids = []
+    for sheet in sheets:
+        version = fetch_sheet_version(client, sheet.id)
+        entry = sheet_manifest.get_sheet_entry(owner, sheet.id)
+        if incremental and sheet_manifest.is_sheet_unchanged(entry, version, destination):
+            process_state.record_sheet_result(
+                job_id, sheet.id, "skipped", f"Unchanged since last backup (version {version})"
+            )
+            continue
+        modified_at = getattr(sheet, "modified_at", None)
+        get_sheet_state(sheet.id)["source_version"] = {
+            "version": version,
+            "modified_at": str(modified_at) if modified_at else None,
+            "sheet_name": getattr(sheet, "name", None),
+            "destination": destination,
+        }
+        sheet_ids.append(sheet.id)
+    return sheet_ids
+
+
+def record_completed_sheet(sheet_id):
+    """
+    Store the backed-up version, Drive file IDs and synced attachments in the manifest for the next run.
+    Returns the names of the stages that failed; with any of them (or a missing attachment) the sheet
+    is recorded as "partial", so INCREMENTAL_BACKUP does not skip it next run.
+    """
+    failed_stages = sorted(get_failed_stages(sheet_id))
+    source = get_sheet_state(sheet_id).get("source_version")
+    if not source or source["version"] is None:
+        return failed_stages
+    attachments, attachments_complete = get_attachment_sync_result(sheet_id)
+    if not attachments_complete:
+        log(f"Sheet {sheet_id}: some attachments did not reach Drive; it will be checked again next run.")
+    if failed_stages:
+        log(f"Sheet {sheet_id}: {', '.join(failed_stages)} failed; it will be backed up again next run.")
+    try:
+        sheet_manifest.record_sheet_backup(
+            get_storage_user_suffix(),
+            sheet_id,
+            version=source["version"],
+            modified_at=source["modified_at"],
+            destination=source["destination"],
+            drive_files=get_recorded_drive_files(sheet_id),
+            attachments=attachments,
+            sheet_name=source["sheet_name"],
+            status="completed" if attachments_complete and not failed_stages else "partial",
+        )
+    except OSError as exc:
+        logger.warning("Could not update the sheet manifest for %s: %s", sheet_id, exc)
+    return failed_stages
+
+
+def _incomplete_sheet_outcome(failed_stages):
+    return "failed", f"Backup incomplete, failed stage(s): {', '.join(failed_stages)}"
+
+
+def process_sheet(job_id, sheet_id):
+    """
+    Runs every stage for one sheet and returns a (state, details) tuple.
+    Expects the job credentials and current job to be set in the calling context.
+    """
+    if process_state.is_cancel_requested():
+        return "cancelled", "Cancelled before start"
+
+    process_state.record_sheet_result(job_id, sheet_id, "running")
+    log(f"Processing sheet {sheet_id}.")
+    try:
+        outcome = _run_sheet_steps(sheet_id, SHEET_STAGES)
+        if outcome:
+            return outcome
+        failed_stages = record_completed_sheet(sheet_id)
+        if failed_stages:
+            return _incomplete_sheet_outcome(failed_stages)
+        return "completed", ""
+    except Exception as exc:
+        logger.exception("Sheet %s failed.", sheet_id)
+        return "failed", str(exc)
+    finally:
+        cleanup_sheet_temp_data(sheet_id)
+
+
+def _run_sheet_worker(job_id, job_credentials, sheet_id):
+    """Pool entry point: binds the job context to the worker thread around process_sheet."""
+    token = config.set_thread_credentials(job_credentials)
+    job_token = process_state.set_current_job(job_id)
+    try:
+        state, details = process_sheet(job_id, sheet_id)
+        process_state.record_sheet_result(job_id, sheet_id, state, details)
+        log(f"Sheet {sheet_id} {state}. {details}".strip())
+        return state
+    finally:
+        process_state.reset_current_job(job_token)
+        config.reset_thread_credentials(token)
+
+
+def run_sheet_pool(job_id, job_credentials, sheet_ids):
+    """Pool mode: each worker runs a whole sheet, fetch to upload, before taking the next one."""
+    worker_count = min(config.get_int_credential("SHEET_WORKER_COUNT", 2, minimum=1), max(len(sheet_ids), 1))
+    log(f"Processing sheets with {worker_count} worker(s).")
+    with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix=f"sheet-{job_id[:8]}") as executor:
+        futures = [
+            executor.submit(_run_sheet_worker, job_id, job_credentials, sheet_id)
+            for sheet_id in sheet_ids
+        ]
+        for done_count, _ in enumerate(as_completed(futures), start=1):
+            process_state.update_status(
+                job_id,
+                progress=f"Processed {done_count} of {len(sheet_ids)} sheets",
+            )
+
+
+class _StageQueue(queue.Queue):
+    """Bounded hand-off queue that remembers which stage group consumes it and publishes its depth."""
+
+    def __init__(self, job_id, stage_name, maxsize):
+        super().__init__(maxsize=maxsize)
+        self.job_id = job_id
+        self.stage_name = stage_name
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        metrics.QUEUE_DEPTH.set(self.qsize(), job=self.job_id, stage=self.stage_name)
+
+    def get(self, block=True, timeout=None):
+        item = super().get(block, timeout)
+        metrics.QUEUE_DEPTH.set(self.qsize(), job=self.job_id, stage=self.stage_name)
+        return item
+
+
+def _finish_pipeline_sheet(job_id, sheet_id, state, details, staging_slots):
+    """Final bookkeeping for a sheet leaving the pipeline: drop its local files and free its disk slot."""
+    try:
+        cleanup_sheet_temp_data(sheet_id)
+    except Exception:
+        logger.exception("Could not clean up temp data for sheet %s.", sheet_id)
+    finally:
+        staging_slots.release()
+    process_state.record_sheet_result(job_id, sheet_id, state, details)
+    log(f"Sheet {sheet_id} {state}. {details}".strip())
+    status = process_state.get_status(job_id) or {}
+    done_count = sum(
+        status.get(key, 0)
+        for key in ("sheets_completed", "sheets_failed", "sheets_cancelled", "sheets_skipped")
+    )
+    process_state.update_status(
+        job_id,
+        progress=f"Processed {done_count} of {status.get('sheets_total', 0)} sheets",
+    )
+
+
+def _run_pipeline_stage(job_id, job_credentials, group_name, steps, inbox, outbox, staging_slots):
+    """
+    Pipeline worker for one stage group. Takes sheet IDs from `inbox` until it sees the done marker
+    and hands successful sheets to `outbox`; the last stage (outbox None) completes them.
+    A failed or cancelled sheet stops here and is not passed downstream. Errors are logged per sheet
+    and never end the worker: the inbox must keep draining, or the upstream put would block the job.
+    """
+    token = config.set_thread_credentials(job_credentials)
+    job_token = process_state.set_current_job(job_id)
+    try:
+        while True:
+            sheet_id = inbox.get()
+            if sheet_id is _PIPELINE_DONE:
+                return
+            try:
+                if process_state.is_cancel_requested():
+                    outcome = ("cancelled", f"Cancelled before {group_name}")
+                else:
+                    process_state.record_sheet_result(job_id, sheet_id, "running", f"Stage: {group_name}")
+                    log(f"Sheet {sheet_id}: {group_name} stage started.")
+                    outcome = _run_sheet_steps(sheet_id, steps)
+                    if not outcome and outbox is None:
+                        failed_stages = record_completed_sheet(sheet_id)
+                        if failed_stages:
+                            outcome = _incomplete_sheet_outcome(failed_stages)
+            except Exception as exc:
+                logger.exception("Sheet %s failed in the %s stage.", sheet_id, group_name)
+                outcome = ("failed", f"{group_name}: {exc}")
+
+            try:
+                if outcome:
+                    _finish_pipeline_sheet(job_id, sheet_id, *outcome, staging_slots)
+                elif outbox is None:
+                    _finish_pipeline_sheet(job_id, sheet_id, "completed", "", staging_slots)
+                else:
+                    try:
+                        process_state.record_sheet_result(job_id, sheet_id, "running", f"Waiting for {outbox.stage_name}")
+                    finally:
+                        outbox.put(sheet_id)
+            except Exception:
+                logger.exception("Sheet %s: bookkeeping after the %s stage failed.", sheet_id, group_name)
+    finally:
+        process_state.reset_current_job(job_token)
+        config.reset_thread_credentials(token)
+
+
+def _acquire_staging_slot(job_id, staging_slots):
+    """
+    Blocks until a sheet may be staged on local disk: a staging slot is free and the tempData
+    disk budget has headroom. Returns False if the job is cancelled meanwhile.
+    """
+    while not staging_slots.acquire(timeout=0.5):
+        if process_state.is_cancel_requested():
+            return False
+    if not disk_budget.wait_for_headroom(job_id, get_base_dir()):
+        staging_slots.release()
+        return False
+    return True
+
+
+def run_sheet_pipeline(job_id, job_credentials, sheet_ids):
+    """
+    Pipeline mode: fetch, transform and upload run as separate stage workers joined by bounded queues,
+    so sheet N can upload to Drive while sheet N+1 downloads from Smartsheet.
+    SHEET_PIPELINE_MAX_STAGED caps how many sheets hold local files at once; fetching pauses when it is reached.
+    """
+    workers_per_stage = min(config.get_int_credential("SHEET_WORKER_COUNT", 2, minimum=1), max(len(sheet_ids), 1))
+    max_staged = config.get_int_credential("SHEET_PIPELINE_MAX_STAGED", 3, minimum=1)
+    staging_slots = threading.BoundedSemaphore(max_staged)
+    log(
+        f"Processing sheets in pipeline mode: {workers_per_stage} worker(s) per stage, "
+        f"at most {max_staged} sheet(s) staged on disk."
+    )
+
+    inboxes = [_StageQueue(job_id, group_name, workers_per_stage) for group_name, _ in SHEET_STAGE_GROUPS]
+    stage_threads = []
+    for index, (group_name, steps) in enumerate(SHEET_STAGE_GROUPS):
+        outbox = inboxes[index + 1] if index + 1 < len(inboxes) else None
+        threads = [
+            threading.Thread(
+                target=_run_pipeline_stage,
+                args=(job_id, job_credentials, group_name, steps, inboxes[index], outbox, staging_slots),
+                name=f"{group_name}-{job_id[:8]}-{worker}",
+                daemon=True,
+            )
+            for worker in range(workers_per_stage)
+        ]
+        for thread in threads:
+            thread.start()
+        stage_threads.append(threads)
+
+    for position, sheet_id in enumerate(sheet_ids):
+        if not _acquire_staging_slot(job_id, staging_slots):
+            for skipped_id in sheet_ids[position:]:
+                process_state.record_sheet_result(job_id, skipped_id, "cancelled", "Cancelled before start")
+            break
+        process_state.record_sheet_result(job_id, sheet_id, "running", "Waiting for fetch")
+        inboxes[0].put(sheet_id)
+
+    # Shut the stages down in order so every queued sheet drains through the later stages.
+    for inbox, threads in zip(inboxes, stage_threads):
+        for _ in threads:
+            inbox.put(_PIPELINE_DONE)
+        for thread in threads:
+            thread.join()
+
+
 def run_migration(job_id, job_credentials):
     """
     Runs the migration process using configuration from the form.
@@ -47,6 +417,8 @@ def run_migration(job_id, job_credentials):
         job_token = process_state.set_current_job(job_id)
         validate_storage_health()
         client = get_smartsheet_client()
+        job_store.save_job_settings(job_id, get_storage_user_suffix(), job_credentials)
+        resume = config.get_bool_credential("RESUME_JOB", False)
 
         #client = smartsheet.Smartsheet()
         smartsheet_folder_id = access_config_file("SMARTSHEET_FOLDER_ID")
@@ -62,66 +434,47 @@ def run_migration(job_id, job_credentials):
             progress=f"Found {len(sheets)} sheets in folder ID {smartsheet_folder_id}.",
         )
         log(f"Found {len(sheets)} sheets in folder {smartsheet_folder_id}.")
-
-        # Process each sheet
+        # Resume mode: sheets this job already completed before it was interrupted are not touched again.
+        completed_before = set()
+        if resume:
+            completed_before = job_store.completed_sheets(job_id) & {str(sheet.id) for sheet in sheets}
+        process_state.init_sheet_results(job_id, sheet_ids_list)
         for sheet in sheets:
-            if process_state.is_cancel_requested():
-                process_state.update_status(job_id, running=False, progress="Migration Cancelled", finished=True)
-                return "Migration Cancelled by User"
-
-            sheet_id = sheet.id
-            process_state.update_status(job_id, progress=f"Processing sheet {sheet_id}...")
-            log(f"Processing sheet {sheet_id}.")
-            try:
-                download_smartsheet_as_excel(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                extract_and_store_comments(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                create_relative_row_mapping(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                merge_comments_with_row_mapping(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                download_smartsheet_attachments(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
+            if str(sheet.id) in completed_before:
+                process_state.record_sheet_result(job_id, sheet.id, "completed", "Completed before the job was resumed")
+        if completed_before:
+            log(f"Resuming job {job_id}: {len(completed_before)} sheet(s) already completed.")
 
-                prepare_sheet_for_drive_upload(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                upload_to_google_drive(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                upload_comments_to_drive(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                upload_attachments_to_drive(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                upload_archive_copy_to_drive(sheet_id)
-                if process_state.is_cancel_requested():
-                    break
-
-                # Optional: simulate delay between processing sheets
-                time.sleep(1)
-            finally:
-                cleanup_sheet_temp_data(sheet_id)
+        sheet_ids = select_sheets_to_back_up(
+            job_id, client, [sheet for sheet in sheets if str(sheet.id) not in completed_before]
+        )
+        skipped_count = len(sheets) - len(completed_before) - len(sheet_ids)
+        if skipped_count:
+            log(f"Skipping {skipped_count} unchanged sheet(s); {len(sheet_ids)} to back up.")
+        load_sheet_checkpoints(job_id, sheet_ids)
+        if (config.get_credential("SHEET_EXECUTION_MODE") or "pipeline").strip().lower() == "pool":
+            run_sheet_pool(job_id, job_credentials, sheet_ids)
+        else:
+            run_sheet_pipeline(job_id, job_credentials, sheet_ids)
 
         if process_state.is_cancel_requested():
             process_state.update_status(job_id, running=False, progress="Migration Cancelled", finished=True)
             return "Migration Cancelled by User"
 
+        status = process_state.get_status(job_id) or {}
+        failed_sheets = [
+            sheet_id for sheet_id, result in status.get("sheets", {}).items() if result["state"] == "failed"
+        ]
+        if failed_sheets:
+            process_state.update_status(
+                job_id,
+                running=False,
+                progress="Migration Completed with errors",
+                details=f"Failed sheets: {', '.join(failed_sheets)}",
+                finished=True,
+            )
+            return f"Migration Completed with {len(failed_sheets)} failed sheet(s)."
+
         process_state.update_status(job_id, running=False, progress="Migration Completed", finished=True)
         print("🎉 Migration Completed Successfully!")
         return "Migration Completed Successfully!"
@@ -130,6 +483,7 @@ def run_migration(job_id, job_credentials):
         logger.exception("Migration failed with an unhandled exception.")
         return f"Migration Failed: {exc}"
     finally:
+        metrics.retire_job(job_id)
         if 'job_token' in locals():
             process_state.reset_current_job(job_token)
         if 'token' in locals():
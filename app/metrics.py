@@ -0,0 +1,237 @@
+import contextvars
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import config
+
+# Seconds; stage buckets reach up to an hour, API buckets cover single HTTP round trips.
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+API_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Series of this many finished jobs are kept for scraping; older ones are dropped.
+FINISHED_JOBS_KEPT = 5
+
+_REGISTRY_LOCK = threading.Lock()
+_METRICS = []
+_FINISHED_JOBS = deque()
+_current_stage = contextvars.ContextVar("current_metrics_stage", default="")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series = {}
+        with _REGISTRY_LOCK:
+            _METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _forget_job(self, job_id):
+        if "job" not in self.label_names:
+            return
+        position = self.label_names.index("job")
+        for key in [key for key in self._series if key[position] == job_id]:
+            del self._series[key]
+
+    def _samples(self):
+        return [(self.name, key, (), value) for key, value in sorted(self._series.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _REGISTRY_LOCK:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _REGISTRY_LOCK:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _REGISTRY_LOCK:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names, buckets):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _REGISTRY_LOCK:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def _samples(self):
+        samples = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append((f"{self.name}_bucket", key, (("le", le),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), series["sum"]))
+            samples.append((f"{self.name}_count", key, (), series["count"]))
+        return samples
+
+
+STAGE_DURATION = Histogram(
+    "ssextractor_stage_duration_seconds", "Time spent in one stage function for one sheet.",
+    ["job", "stage"], STAGE_BUCKETS,
+)
+STAGE_RUNS = Counter(
+    "ssextractor_stage_runs_total", "Stage function runs by outcome (ok, failed, cancelled).",
+    ["job", "stage", "outcome"],
+)
+API_REQUESTS = Counter(
+    "ssextractor_api_requests_total", "HTTP requests sent to Smartsheet, attachment storage and Google APIs.",
+    ["job", "stage", "host", "status"],
+)
+API_DURATION = Histogram(
+    "ssextractor_api_request_duration_seconds", "Round-trip time of one HTTP request.",
+    ["job", "stage", "host"], API_BUCKETS,
+)
+API_RETRIES = Counter(
+    "ssextractor_api_retries_total", "Requests retried after a throttled or transient failure.",
+    ["job", "stage", "host", "reason"],
+)
+DOWNLOADED_BYTES = Counter(
+    "ssextractor_downloaded_bytes_total", "Bytes downloaded from Smartsheet and attachment storage.",
+    ["job", "stage", "host"],
+)
+UPLOADED_BYTES = Counter(
+    "ssextractor_uploaded_bytes_total", "Bytes uploaded to Google Drive.",
+    ["job", "stage", "host"],
+)
+QUEUE_DEPTH = Gauge(
+    "ssextractor_pipeline_queue_depth", "Sheets waiting in front of a pipeline stage group.",
+    ["job", "stage"],
+)
+ACTIVE_WORKERS = Gauge(
+    "ssextractor_active_workers", "Threads currently running a stage or a file transfer.",
+    ["job", "stage"],
+)
+
+
+def current_job():
+    return config.get_credential("JOB_ID") or ""
+
+
+def current_stage():
+    return _current_stage.get()
+
+
+def set_stage(stage):
+    """Label work done in this context (and pools submitted from it) with `stage`; returns a reset token."""
+    return _current_stage.set(stage)
+
+
+def reset_stage(token):
+    _current_stage.reset(token)
+
+
+def url_host(url):
+    return urlsplit(url).hostname or ""
+
+
+def record_api_call(host, status, elapsed_seconds):
+    job, stage = current_job(), current_stage()
+    API_REQUESTS.inc(job=job, stage=stage, host=host, status=status)
+    API_DURATION.observe(elapsed_seconds, job=job, stage=stage, host=host)
+
+
+def record_retry(host, reason):
+    API_RETRIES.inc(job=current_job(), stage=current_stage(), host=host, reason=reason)
+
+
+def record_download(host, nbytes):
+    DOWNLOADED_BYTES.inc(nbytes, job=current_job(), stage=current_stage(), host=host)
+
+
+def record_upload(host, nbytes):
+    UPLOADED_BYTES.inc(nbytes, job=current_job(), stage=current_stage(), host=host)
+
+
+@contextmanager
+def track_active(stage):
+    """Count the enclosed work in ssextractor_active_workers for the current job."""
+    job = current_job()
+    ACTIVE_WORKERS.inc(job=job, stage=stage)
+    try:
+        yield
+    finally:
+        ACTIVE_WORKERS.dec(job=job, stage=stage)
+
+
+def requests_response_hook(response, *args, **kwargs):
+    """requests Session response hook: counts each request with its host, status and elapsed time."""
+    record_api_call(url_host(response.url), response.status_code, response.elapsed.total_seconds())
+
+
+def retire_job(job_id):
+    """Called when a job ends; keeps its series for the last FINISHED_JOBS_KEPT jobs only."""
+    with _REGISTRY_LOCK:
+        if job_id in _FINISHED_JOBS:
+            return
+        _FINISHED_JOBS.append(job_id)
+        while len(_FINISHED_JOBS) > FINISHED_JOBS_KEPT:
+            expired = _FINISHED_JOBS.popleft()
+            for metric in _METRICS:
+                metric._forget_job(expired)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _REGISTRY_LOCK:
+        lines = [line for metric in _METRICS for line in metric.render()]
+    return "\n".join(lines) + "\n"
@@ -1,25 +1,62 @@
 import threading
+import time
 import contextvars
 import uuid
+from collections import deque
 from datetime import datetime
 
+import config
+import job_store
+
 _jobs_lock = threading.Lock()
 _jobs = {}
 _current_job_id = contextvars.ContextVar("current_job_id", default=None)
+# Details change once or more per file transferred; the job store gets them at most this often.
+DETAILS_PERSIST_INTERVAL_SECONDS = 5.0
 
 
 def _now_iso():
     return datetime.utcnow().isoformat() + "Z"
 
 
-def create_job(initial_status=None):
-    job_id = uuid.uuid4().hex
+def _new_event_stream():
+    # Bounded ring buffer: publishers never wait on readers, and a reader that falls further
+    # behind than the buffer gets a fresh snapshot instead of the deltas it missed.
+    size = config.get_int_credential("JOB_EVENT_BUFFER_SIZE", 1000, minimum=10)
+    return {"condition": threading.Condition(), "events": deque(maxlen=size), "last_id": 0}
+
+
+def _publish_unlocked(job, event_type, data):
+    """Append a status delta to the job's event stream; called with _jobs_lock held to keep order."""
+    stream = job["events"]
+    with stream["condition"]:
+        stream["last_id"] += 1
+        stream["events"].append((stream["last_id"], event_type, data))
+        stream["condition"].notify_all()
+
+
+def _sheet_counts(status):
+    return {
+        key: status[key]
+        for key in ("sheets_total", "sheets_completed", "sheets_failed", "sheets_cancelled", "sheets_skipped")
+    }
+
+
+def create_job(initial_status=None, job_id=None):
+    """Register a job in memory and in the job store; pass `job_id` to bring a stored job back to life."""
+    job_id = job_id or uuid.uuid4().hex
     status = {
         "running": True,
         "progress": "Starting migration",
         "details": "",
         "started_at": _now_iso(),
         "finished_at": None,
+        "sheets_total": 0,
+        "sheets_completed": 0,
+        "sheets_failed": 0,
+        "sheets_cancelled": 0,
+        "sheets_skipped": 0,
+        "sheets": {},
     }
     if initial_status:
         status.update(initial_status)
@@ -27,7 +64,10 @@ def create_job(initial_status=None):
         _jobs[job_id] = {
             "status": status,
             "cancel_requested": False,
+            "events": _new_event_stream(),
+            "persisted_at": time.monotonic(),
         }
+    job_store.save_job_status(job_id, status)
     return job_id
 
 
@@ -39,29 +79,92 @@ def reset_current_job(token):
     _current_job_id.reset(token)
 
 
+def is_job_active(job_id):
+    """True while a job with this ID is loaded in this process and still running."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return bool(job and job["status"]["running"])
+
+
 def get_status(job_id):
     with _jobs_lock:
         job = _jobs.get(job_id)
         if not job:
             return None
-        return dict(job["status"])
+        status = dict(job["status"])
+        status["sheets"] = {sheet_id: dict(result) for sheet_id, result in status["sheets"].items()}
+        return status
+
+
+def status_snapshot(job_id):
+    """
+    Return (last event ID, status) read together, so a stream client can start from the snapshot
+    and apply only the events after that ID. None if the job is not in memory.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return None
+        status = dict(job["status"])
+        status["sheets"] = {sheet_id: dict(result) for sheet_id, result in status["sheets"].items()}
+        with job["events"]["condition"]:
+            return job["events"]["last_id"], status
+
+
+def wait_for_events(job_id, after_id, timeout):
+    """
+    Block up to `timeout` seconds for events newer than `after_id` and return (events, missed).
+    `events` is a list of (event ID, type, data); `missed` is True when older events than the
+    buffer holds were requested, or an ID this stream never issued (for example one from before
+    a restart), in which case the caller should resend a snapshot.
+    Only the job's own stream lock is taken while waiting, not _jobs_lock.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return None
+        stream = job["events"]
+    with stream["condition"]:
+        if after_id > stream["last_id"]:
+            return [], True
+        stream["condition"].wait_for(lambda: stream["last_id"] > after_id, timeout=timeout)
+        events = [event for event in stream["events"] if event[0] > after_id]
+        missed = bool(events) and events[0][0] != after_id + 1
+        return events, missed
 
 
 def update_status(job_id, *, running=None, progress=None, details=None, finished=False):
+    """
+    Apply status changes and publish them to the event stream. State transitions (running, progress,
+    finished) are written to the job store at once; details-only changes at most every
+    DETAILS_PERSIST_INTERVAL_SECONDS, so per-file progress notes stay off the store's lock.
+    """
     with _jobs_lock:
         job = _jobs.get(job_id)
         if not job:
             return False
         status = job["status"]
+        changes = {}
         if running is not None:
-            status["running"] = running
+            changes["running"] = running
         if progress is not None:
-            status["progress"] = progress
+            changes["progress"] = progress
         if details is not None:
-            status["details"] = details
+            changes["details"] = details
         if finished:
-            status["finished_at"] = _now_iso()
-        return True
+            changes["finished_at"] = _now_iso()
+        changes = {key: value for key, value in changes.items() if status.get(key) != value}
+        if not changes:
+            return True
+        status.update(changes)
+        _publish_unlocked(job, "status", changes)
+        now = time.monotonic()
+        if set(changes) == {"details"} and now - job["persisted_at"] < DETAILS_PERSIST_INTERVAL_SECONDS:
+            return True
+        job["persisted_at"] = now
+        snapshot = dict(status)
+    job_store.save_job_status(job_id, snapshot)
+    return True
 
 
 def update_current_status(*, running=None, progress=None, details=None, finished=False):
@@ -77,6 +180,51 @@ def update_current_status(*, running=None, progress=None, details=None, finished
     )
 
 
+def _refresh_sheet_counts(status):
+    states = [result["state"] for result in status["sheets"].values()]
+    status["sheets_total"] = len(states)
+    status["sheets_completed"] = states.count("completed")
+    status["sheets_failed"] = states.count("failed")
+    status["sheets_cancelled"] = states.count("cancelled")
+    status["sheets_skipped"] = states.count("skipped")
+
+
+def init_sheet_results(job_id, sheet_ids):
+    """Register every sheet of a job as queued so per-sheet progress can be rolled up."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return False
+        status = job["status"]
+        status["sheets"] = {
+            str(sheet_id): {"state": "queued", "details": "", "updated_at": _now_iso()}
+            for sheet_id in sheet_ids
+        }
+        _refresh_sheet_counts(status)
+        sheets = {sheet_id: dict(result) for sheet_id, result in status["sheets"].items()}
+        _publish_unlocked(job, "sheets", dict(_sheet_counts(status), sheets=sheets))
+    job_store.init_sheets(job_id, sheet_ids)
+    return True
+
+
+def record_sheet_result(job_id, sheet_id, state, details=""):
+    """Record a sheet state (queued, running, completed, failed, cancelled, skipped) on the job status."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return False
+        status = job["status"]
+        result = status["sheets"][str(sheet_id)] = {
+            "state": state,
+            "details": details or "",
+            "updated_at": _now_iso(),
+        }
+        _refresh_sheet_counts(status)
+        _publish_unlocked(job, "sheet", dict(_sheet_counts(status), sheet_id=str(sheet_id), result=dict(result)))
+    job_store.record_sheet(job_id, sheet_id, state, details)
+    return True
+
+
 def request_cancel(job_id):
     with _jobs_lock:
         job = _jobs.get(job_id)
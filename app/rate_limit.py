@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import BaseAdapter
+
+import metrics
+import process_state
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+MAX_BACKOFF_SECONDS = 60.0
+
+_BUCKETS_LOCK = threading.Lock()
+_BUCKETS = {}
+
+
+class TokenBucket:
+    """
+    Requests-per-minute budget shared by every thread that uses the same API key.
+    A throttled response pauses the whole bucket, so all workers back off together.
+    """
+
+    def __init__(self, requests_per_minute):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self.configure(requests_per_minute)
+        self._tokens = float(self.capacity)
+
+    def configure(self, requests_per_minute):
+        with self._lock:
+            self.rate_per_second = max(requests_per_minute, 1) / 60.0
+            # Allow a burst of about ten seconds' worth of requests.
+            self.capacity = max(1, int(requests_per_minute // 6))
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(float(self.capacity), self._tokens + elapsed * self.rate_per_second)
+
+    def acquire(self):
+        """Block until one request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait_seconds = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait_seconds = (1 - self._tokens) / self.rate_per_second
+            time.sleep(min(wait_seconds, 1.0))
+
+    def pause(self, seconds):
+        """Hold every caller of this bucket for at least `seconds` (used after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def get_bucket(api_key, requests_per_minute):
+    """Return the process-wide bucket for an API key, applying the latest configured budget."""
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(api_key)
+        if bucket is None:
+            bucket = _BUCKETS[api_key] = TokenBucket(requests_per_minute)
+        elif bucket.rate_per_second * 60 != requests_per_minute:
+            bucket.configure(requests_per_minute)
+        return bucket
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Retry-After plus a little jitter when the server gave one, else capped exponential backoff with jitter."""
+    if retry_after is not None:
+        return min(retry_after, MAX_BACKOFF_SECONDS) + random.uniform(0, 1)
+    base = min(2 ** attempt, MAX_BACKOFF_SECONDS)
+    return base / 2 + random.uniform(0, base / 2)
+
+
+def _sleep_unless_cancelled(seconds):
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        if process_state.is_cancel_requested():
+            return False
+        time.sleep(min(remaining, 0.5))
+
+
+class RateLimitedAdapter(BaseAdapter):
+    """
+    Transport adapter that takes a token before every request and retries throttled (429)
+    and transient 5xx responses, honouring Retry-After. Wraps the SDK's own adapter so its
+    TLS settings and connection pool are kept.
+    """
+
+    def __init__(self, inner_adapter, bucket, max_retries):
+        super().__init__()
+        self.inner_adapter = inner_adapter
+        self.bucket = bucket
+        self.max_retries = max_retries
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        host = metrics.url_host(request.url)
+        while True:
+            self.bucket.acquire()
+            started = time.monotonic()
+            response = self.inner_adapter.send(request, **kwargs)
+            status = response.status_code
+            metrics.record_api_call(host, status, time.monotonic() - started)
+            retryable = status == 429 or (status in RETRYABLE_STATUSES and request.method in IDEMPOTENT_METHODS)
+            if not retryable or attempt >= self.max_retries:
+                return response
+
+            attempt += 1
+            metrics.record_retry(host, str(status))
+            delay = backoff_delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+            if status == 429:
+                self.bucket.pause(delay)
+            print(
+                f"Smartsheet returned {status} for {request.method} {request.path_url}; "
+                f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+            )
+            # Read the (small) error body so the connection goes back to the pool while we wait.
+            response.content
+            if not _sleep_unless_cancelled(delay):
+                return response
+
+    def close(self):
+        self.inner_adapter.close()
+
+
+def install_rate_limiter(session, api_key, *, requests_per_minute, max_retries):
+    """
+    Route every request of a requests.Session (such as the Smartsheet SDK's) through the shared limiter.
+    Raises TypeError for anything else, so a changed SDK never runs without rate limiting unnoticed.
+    """
+    if not isinstance(session, requests.Session):
+        raise TypeError(f"Cannot install the Smartsheet rate limiter on {type(session).__name__}; expected a requests.Session.")
+    bucket = get_bucket(api_key, requests_per_minute)
+    for prefix in ("https://", "http://"):
+        inner_adapter = session.get_adapter(prefix)
+        if isinstance(inner_adapter, RateLimitedAdapter):
+            inner_adapter = inner_adapter.inner_adapter
+        session.mount(prefix, RateLimitedAdapter(inner_adapter, bucket, max_retries))
+    return bucket
@@ -0,0 +1,100 @@
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config
+
+_MANIFEST_LOCK = threading.RLock()
+_MANIFEST_CACHE = {}
+
+
+def _manifest_file_path() -> Path:
+    raw_path = config.CREDENTIALS.get("SHEET_MANIFEST_FILE") or "sheet_manifest.json"
+    return Path(raw_path)
+
+
+def _entry_key(owner, sheet_id):
+    return f"{owner}:{sheet_id}"
+
+
+def _load_manifest_unlocked(manifest_path):
+    cache_key = str(manifest_path)
+    if cache_key in _MANIFEST_CACHE:
+        return _MANIFEST_CACHE[cache_key]
+
+    sheets = {}
+    if manifest_path.exists():
+        try:
+            payload = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if isinstance(payload.get("sheets"), dict):
+                sheets = payload["sheets"]
+        except (OSError, json.JSONDecodeError, AttributeError):
+            sheets = {}
+    _MANIFEST_CACHE[cache_key] = sheets
+    return sheets
+
+
+def _write_manifest_unlocked(manifest_path, sheets):
+    payload = {
+        "sheets": sheets,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = manifest_path.with_name(f"{manifest_path.name}.tmp")
+    temp_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    temp_path.replace(manifest_path)
+
+
+def get_sheet_entry(owner, sheet_id):
+    """Return a copy of the manifest entry for a sheet backed up by `owner` (API key suffix), or None."""
+    with _MANIFEST_LOCK:
+        entry = _load_manifest_unlocked(_manifest_file_path()).get(_entry_key(owner, sheet_id))
+        return json.loads(json.dumps(entry)) if entry else None
+
+
+def is_sheet_unchanged(entry, version, destination):
+    """True when the last backup completed for this exact sheet version and Drive destination."""
+    if not entry or version is None:
+        return False
+    return (
+        entry.get("last_status") == "completed"
+        and entry.get("version") == version
+        and entry.get("destination") == destination
+    )
+
+
+def record_sheet_backup(
+    owner,
+    sheet_id,
+    *,
+    version,
+    modified_at,
+    destination,
+    drive_files,
+    attachments=None,
+    sheet_name=None,
+    status="completed",
+):
+    """
+    Persist the outcome of a sheet backup (temp file + replace, like the archive settings).
+    `attachments` maps attachment ID to its name, size, row and Drive file ID; a "partial" status
+    keeps the sheet from being skipped next run while still letting synced attachments be reused.
+    """
+    entry = {
+        "sheet_id": str(sheet_id),
+        "sheet_name": sheet_name,
+        "version": version,
+        "modified_at": modified_at,
+        "destination": destination,
+        "drive_files": drive_files or {},
+        "attachments": attachments or {},
+        "last_status": status,
+        "backed_up_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with _MANIFEST_LOCK:
+        manifest_path = _manifest_file_path()
+        sheets = _load_manifest_unlocked(manifest_path)
+        sheets[_entry_key(owner, sheet_id)] = entry
+        _write_manifest_unlocked(manifest_path, sheets)
+    return entry
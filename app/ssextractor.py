@@ -1,31 +1,54 @@
 import re
+import io
 import os
+import json
 import shutil
 import mimetypes
 import pandas as pd
+from openpyxl import Workbook, load_workbook
 import requests
 import glob  # Used for wildcard search
+import random
+import socket
+import httplib2
 import smartsheet
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.http import build_http
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaUpload
 from googleapiclient.errors import HttpError
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials as UserCredentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 #from dotenv import load_dotenv
 import time  # For sleep
 import contextvars
+from contextlib import ExitStack
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import process_state
 import config
 from pathlib import Path
 from archive_settings import get_active_archive_root_id
+import sheet_manifest
+import disk_budget
+import job_store
+import metrics
+from rate_limit import install_rate_limiter, get_bucket
+from upload_control import get_upload_controller
 
 # Project paths (resource folder holds generated downloads)
 DEFAULT_BASE_DIR = Path("/app/tempData")
 DEFAULT_ARCHIVE_DRIVE_ROOT_FOLDER_ID = "1etSuruprwmdWmHgPiIEePHlb02xRVUXR"
 
-_GOOGLE_CTX = contextvars.ContextVar("google_services_ctx", default=None)
+# Google credentials are shared process-wide per credential file; API clients are per thread.
+_GOOGLE_LOCK = threading.Lock()
+_GOOGLE_CREDENTIALS = {}
+_DISCOVERY_DOCS = {}
+_THREAD_GOOGLE = threading.local()
 
 def get_base_dir() -> Path:
     base_dir_raw = config.get_credential("SMARTSHEET_BASE_DIR") or str(DEFAULT_BASE_DIR)
@@ -54,9 +77,31 @@ def get_base_dir() -> Path:
 def validate_storage_health() -> Path:
     """
     Validate the configured storage base path before startup or a migration run.
-    Raises RuntimeError when the working directory cannot be created or accessed.
+    Raises RuntimeError when the working directory cannot be created or accessed,
+    or has less than TEMP_DISK_MIN_FREE_MB free.
     """
-    return get_base_dir()
+    base_dir = get_base_dir()
+    disk_budget.check_free_space(base_dir)
+    return base_dir
+
+
+def charge_staged_file(sheet_id, file_path):
+    """Account a file written to tempData against the job's disk budget."""
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        return
+    disk_budget.charge(config.get_credential("JOB_ID"), sheet_id, size)
+
+
+def replace_staged_file(sheet_id, partial_path, target_path):
+    """os.replace a rewritten tempData file into place and charge the change in size to the disk budget."""
+    try:
+        previous_size = os.path.getsize(target_path)
+    except OSError:
+        previous_size = 0
+    os.replace(partial_path, target_path)
+    disk_budget.charge(config.get_credential("JOB_ID"), sheet_id, os.path.getsize(target_path) - previous_size)
 
 
 def get_storage_user_suffix() -> str:
@@ -127,22 +172,21 @@ def _load_user_credentials(client_secret_file, token_file):
             token.write(creds.to_json())
     return creds
 
-def get_google_services():
-    """
-    Returns Drive and Sheets service clients using either service account
-    credentials or OAuth2 user credentials based on config.
-    """
-    ctx = _GOOGLE_CTX.get()
-    current_creds_id = id(config.get_credentials())
-    if ctx and ctx.get("creds_id") == current_creds_id:
-        try:
-            if not ctx["google_credentials"].valid:
-                ctx["google_credentials"].refresh(Request())
-            return ctx["drive_service"], ctx["sheet_service"], ctx["google_credentials"]
-        except Exception:
-            ctx = None
-            _GOOGLE_CTX.set(None)
+def _google_credentials_key():
+    """Identify the configured credential; the file's mtime makes a replaced token/key file load afresh."""
+    auth_type = (_get_google_auth_setting("GOOGLE_AUTH_TYPE", "service_account")).lower()
+    if auth_type == "oauth":
+        credential_file = _get_google_auth_setting("GOOGLE_OAUTH_TOKEN_FILE", "token.json")
+    else:
+        credential_file = _get_google_auth_setting("GOOGLE_SERVICE_ACCOUNT_FILE", DEFAULT_SERVICE_ACCOUNT_FILE)
+    try:
+        modified = os.path.getmtime(credential_file)
+    except OSError:
+        modified = None
+    return (auth_type, os.path.abspath(credential_file), modified)
 
+
+def _load_google_credentials():
     auth_type = (_get_google_auth_setting("GOOGLE_AUTH_TYPE", "service_account")).lower()
     service_account_file = _get_google_auth_setting("GOOGLE_SERVICE_ACCOUNT_FILE", DEFAULT_SERVICE_ACCOUNT_FILE)
     client_secret_file = _get_google_auth_setting("GOOGLE_OAUTH_CLIENT_SECRET_FILE", "client_secret.json")
@@ -151,26 +195,97 @@ def get_google_services():
     if auth_type == "service_account":
         if not os.path.exists(service_account_file):
             raise FileNotFoundError(f"Service account file not found: {service_account_file}")
-        google_credentials = service_account.Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
-    elif auth_type == "oauth":
-        google_credentials = _load_user_credentials(client_secret_file, token_file)
-    else:
-        raise ValueError("GOOGLE_AUTH_TYPE must be 'service_account' or 'oauth'.")
-
-    if not google_credentials.valid:
-        google_credentials.refresh(Request())
-
-    drive_service = build("drive", "v3", credentials=google_credentials)
-    sheet_service = build("sheets", "v4", credentials=google_credentials)
-    _GOOGLE_CTX.set(
-        {
-            "creds_id": current_creds_id,
-            "drive_service": drive_service,
-            "sheet_service": sheet_service,
-            "google_credentials": google_credentials,
-        }
-    )
-    return drive_service, sheet_service, google_credentials
+        return service_account.Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+    if auth_type == "oauth":
+        return _load_user_credentials(client_secret_file, token_file)
+    raise ValueError("GOOGLE_AUTH_TYPE must be 'service_account' or 'oauth'.")
+
+
+def _refresh_google_credentials(entry):
+    """Refresh the shared access token once; threads arriving meanwhile wait and reuse it."""
+    credentials = entry["credentials"]
+    if credentials.valid:
+        return
+    with entry["refresh_lock"]:
+        if not credentials.valid:
+            credentials.refresh(Request())
+
+
+def _get_shared_google_credentials():
+    key = _google_credentials_key()
+    with _GOOGLE_LOCK:
+        entry = _GOOGLE_CREDENTIALS.get(key)
+    if entry is None:
+        # Load (file I/O, or the interactive OAuth flow) without the process-wide lock, so other jobs'
+        # Google calls keep going; if another thread published an entry meanwhile, that one wins.
+        loaded = {"credentials": _load_google_credentials(), "refresh_lock": threading.Lock()}
+        with _GOOGLE_LOCK:
+            entry = _GOOGLE_CREDENTIALS.setdefault(key, loaded)
+    try:
+        _refresh_google_credentials(entry)
+    except Exception:
+        # A revoked or rotated credential is loaded from disk again on the next call.
+        with _GOOGLE_LOCK:
+            if _GOOGLE_CREDENTIALS.get(key) is entry:
+                del _GOOGLE_CREDENTIALS[key]
+        raise
+    return key, entry
+
+
+class _SharedCredentialHttp(AuthorizedHttp):
+    """AuthorizedHttp whose token refresh goes through the shared credential's lock."""
+
+    def __init__(self, entry):
+        super().__init__(entry["credentials"], http=build_http())
+        self._credential_entry = entry
+
+    def request(self, uri, *args, **kwargs):
+        _refresh_google_credentials(self._credential_entry)
+        started = time.monotonic()
+        response, content = super().request(uri, *args, **kwargs)
+        metrics.record_api_call(metrics.url_host(uri), response.status, time.monotonic() - started)
+        return response, content
+
+
+def _discovery_document(api_name, api_version):
+    """Bundled (static) discovery document, read from disk once per process."""
+    with _GOOGLE_LOCK:
+        if (api_name, api_version) not in _DISCOVERY_DOCS:
+            _DISCOVERY_DOCS[(api_name, api_version)] = discovery_cache.get_static_doc(api_name, api_version)
+        return _DISCOVERY_DOCS[(api_name, api_version)]
+
+
+def _build_google_client(api_name, api_version, http):
+    document = _discovery_document(api_name, api_version)
+    if document is None:
+        return build(api_name, api_version, http=http, static_discovery=False, cache_discovery=False)
+    root_url = config.get_credential("GOOGLE_API_ROOT_URL")
+    if root_url:
+        # Point every request, media upload and batch at another host (such as the offline benchmark's stand-in).
+        document = dict(json.loads(document) if isinstance(document, str) else document)
+        document["rootUrl"] = root_url.rstrip("/") + "/"
+    return build_from_document(document, http=http)
+
+
+def get_google_services():
+    """
+    Returns Drive and Sheets service clients using either service account
+    credentials or OAuth2 user credentials based on config.
+
+    httplib2 clients are not thread-safe, so each thread gets its own pair, built once from the
+    bundled discovery documents on top of one credential shared by every thread and job.
+    """
+    key, entry = _get_shared_google_credentials()
+    services = getattr(_THREAD_GOOGLE, "services", None)
+    if services is None:
+        services = _THREAD_GOOGLE.services = {}
+    cached = services.get(key)
+    if cached is None or cached[0] is not entry:
+        http = _SharedCredentialHttp(entry)
+        cached = (entry, _build_google_client("drive", "v3", http), _build_google_client("sheets", "v4", http))
+        services[key] = cached
+    return cached[1], cached[2], entry["credentials"]
+
 
 def describe_drive_item(item_id, label):
     """Log Drive item metadata to confirm shared-drive vs My Drive."""
@@ -191,24 +306,88 @@ def describe_drive_item(item_id, label):
     except Exception as e:
         print(f"Failed to describe Drive item {label} ({item_id}): {e}")
 
+_SMARTSHEET_CLIENTS_LOCK = threading.Lock()
+_SMARTSHEET_CLIENTS = {}
+_ATTACHMENT_SESSION_LOCK = threading.Lock()
+_ATTACHMENT_SESSION = None
+
+
+def get_smartsheet_api_base():
+    """Smartsheet API base URL: SMARTSHEET_API_BASE (e.g. the offline benchmark) or the SDK default."""
+    return config.get_credential("SMARTSHEET_API_BASE") or smartsheet.smartsheet.__api_base__
+
+
 def get_smartsheet_client():
+    """
+    Return the process-wide Smartsheet SDK client for the current API key.
+    Clients are reused by every stage, thread and job using that key, so their connection pool
+    (SMARTSHEET_HTTP_POOL_SIZE) stays warm; all of them share the key's rate limiter.
+    """
     import config
     api_key = config.get_credential("SMARTSHEET_API_KEY")
     #print("DEBUG: API Key is:", api_key)  # This should print the key entered by the user
     if not api_key:
         raise ValueError("No API key provided. Please update config.CREDENTIALS.")
-    return smartsheet.Smartsheet(api_key)
+    api_base = get_smartsheet_api_base()
+    requests_per_minute = config.get_int_credential("SMARTSHEET_REQUESTS_PER_MINUTE", 300, minimum=1)
+    with _SMARTSHEET_CLIENTS_LOCK:
+        client = _SMARTSHEET_CLIENTS.get((api_key, api_base))
+        if client is None:
+            client = smartsheet.Smartsheet(
+                api_key,
+                max_connections=config.get_int_credential("SMARTSHEET_HTTP_POOL_SIZE", 16, minimum=1),
+                api_base=api_base,
+            )
+            # Every client for the same API key shares one request budget across threads and jobs.
+            # The SDK has no public hook for its session, so a missing _session must fail here, not silently.
+            session = getattr(client, "_session", None)
+            if session is None:
+                raise RuntimeError(
+                    "The Smartsheet SDK client has no _session attribute; cannot install the rate limiter. "
+                    "Check the smartsheet-python-sdk version."
+                )
+            install_rate_limiter(
+                session,
+                api_key,
+                requests_per_minute=requests_per_minute,
+                max_retries=config.get_int_credential("SMARTSHEET_MAX_RETRIES", 6, minimum=0),
+            )
+            _SMARTSHEET_CLIENTS[(api_key, api_base)] = client
+        else:
+            get_bucket(api_key, requests_per_minute)
+    return client
 
-def iter_sheet_rows(smartsheet_client, sheet_id, page_size=500):
+
+def get_attachment_http_session():
+    """
+    Shared keep-alive session for Smartsheet's pre-signed attachment URLs, so repeated downloads
+    reuse TCP/TLS connections instead of a handshake per file. It carries no auth headers:
+    adding Authorization breaks the pre-signed S3 downloads.
+    """
+    global _ATTACHMENT_SESSION
+    with _ATTACHMENT_SESSION_LOCK:
+        if _ATTACHMENT_SESSION is None:
+            pool_size = config.get_int_credential("ATTACHMENT_HTTP_POOL_SIZE", 32, minimum=1)
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.hooks["response"].append(metrics.requests_response_hook)
+            _ATTACHMENT_SESSION = session
+        return _ATTACHMENT_SESSION
+
+
+def iter_sheet_rows(smartsheet_client, sheet_id, page_size=500, include=None):
     """
     Yield all rows for a sheet using pagination.
     Smartsheet defaults to ~100 rows per call; without paging, large sheets are truncated.
+    `include` is passed to get_sheet (e.g. "attachments" to populate row.attachments).
     """
     if not page_size or page_size <= 0:
         page_size = 500
 
     page = 1
-    use_list_rows = hasattr(smartsheet_client.Sheets, "list_rows")
+    use_list_rows = include is None and hasattr(smartsheet_client.Sheets, "list_rows")
 
     while True:
         if process_state.is_cancel_requested():
@@ -233,10 +412,11 @@ def iter_sheet_rows(smartsheet_client, sheet_id, page_size=500):
             except (AttributeError, TypeError):
                 use_list_rows = False
 
+        include_kwargs = {"include": include} if include else {}
         try:
-            sheet = smartsheet_client.Sheets.get_sheet(sheet_id, page_size=page_size, page=page)
+            sheet = smartsheet_client.Sheets.get_sheet(sheet_id, page_size=page_size, page=page, **include_kwargs)
         except TypeError:
-            sheet = smartsheet_client.Sheets.get_sheet(sheet_id, pageSize=page_size, page=page)
+            sheet = smartsheet_client.Sheets.get_sheet(sheet_id, pageSize=page_size, page=page, **include_kwargs)
 
         rows = getattr(sheet, "rows", None) or []
         if not rows:
@@ -247,6 +427,168 @@ def iter_sheet_rows(smartsheet_client, sheet_id, page_size=500):
             break
         page += 1
 
+# Per-sheet working state shared by the stage functions of one job (row snapshot, parsed data, ...).
+# Entries are keyed by job and sheet and dropped by cleanup_sheet_temp_data.
+_SHEET_STATE_LOCK = threading.Lock()
+_SHEET_STATE = {}
+
+RowSnapshot = namedtuple("RowSnapshot", ["row_number", "row_id", "modified_at", "has_attachments"])
+
+
+def _sheet_state_key(sheet_id):
+    return (config.get_credential("JOB_ID"), get_storage_user_suffix(), str(sheet_id))
+
+
+def get_sheet_state(sheet_id):
+    """Return the mutable working-state dict for a sheet in the current job."""
+    key = _sheet_state_key(sheet_id)
+    with _SHEET_STATE_LOCK:
+        return _SHEET_STATE.setdefault(key, {})
+
+
+def clear_sheet_state(sheet_id):
+    with _SHEET_STATE_LOCK:
+        _SHEET_STATE.pop(_sheet_state_key(sheet_id), None)
+
+
+def mark_stage_failed(sheet_id, stage, error):
+    """Note that a stage swallowed an error, so the sheet is not recorded as completely backed up."""
+    get_sheet_state(sheet_id).setdefault("failed_stages", {})[stage] = str(error)
+
+
+def get_failed_stages(sheet_id):
+    """Stage name → error for every stage of this sheet that failed in the current job."""
+    return dict(get_sheet_state(sheet_id).get("failed_stages", {}))
+
+
+def get_sheet_row_snapshot(sheet_id, smartsheet_client=None):
+    """
+    Return the sheet's rows as a list of RowSnapshot tuples sorted by row number.
+    Rows are paged from Smartsheet once per sheet (with attachments and discussions included for the
+    flag, since discussion attachments are listed with the row too) and reused by every stage;
+    an incomplete fetch (cancellation) is not cached.
+    """
+    state = get_sheet_state(sheet_id)
+    snapshot = state.get("rows")
+    if snapshot is not None:
+        return snapshot
+
+    smartsheet_client = smartsheet_client or get_smartsheet_client()
+    snapshot = [
+        RowSnapshot(
+            row_number=row.row_number,
+            row_id=row.id,
+            modified_at=str(getattr(row, "modified_at", None) or ""),
+            has_attachments=bool(getattr(row, "attachments", None) or getattr(row, "discussions", None)),
+        )
+        for row in iter_sheet_rows(smartsheet_client, sheet_id, include="attachments,discussions")
+    ]
+    snapshot.sort(key=lambda row: row.row_number)
+    if process_state.is_cancel_requested():
+        return snapshot
+
+    state["rows"] = snapshot
+    print(f"Fetched row snapshot for sheet {sheet_id}: {len(snapshot)} rows")
+    return snapshot
+
+
+def fetch_sheet_version(smartsheet_client, sheet_id):
+    """Return the sheet's current version number (one lightweight API call), or None if unavailable."""
+    try:
+        response = smartsheet_client.Sheets.get_sheet_version(sheet_id)
+    except Exception as e:
+        print(f"Could not read version of sheet {sheet_id}: {e}")
+        return None
+    version = getattr(response, "version", None)
+    if version is None:
+        error = getattr(response, "result", None)
+        print(f"Could not read version of sheet {sheet_id}: {getattr(error, 'message', None)}")
+    return version
+
+
+def get_backup_destination():
+    """Drive folders a sheet is backed up to; a change of destination forces a full backup."""
+    return {
+        "sheets": config.get_credential("GOOGLE_DRIVE_SHEETS_FOLDER_ID"),
+        "comments": config.get_credential("GOOGLE_DRIVE__COMMENTS_FOLDER_ID"),
+        "attachments": config.get_credential("GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID"),
+        "archive": get_archive_drive_root_folder_id(),
+    }
+
+
+def _iter_index_pages(fetch_page, page_size):
+    """Yield items from a paginated Smartsheet IndexResult endpoint, raising on Error responses."""
+    page = 1
+    while True:
+        if process_state.is_cancel_requested():
+            return
+        result = fetch_page(page_size=page_size, page=page)
+        items = getattr(result, "data", None)
+        if items is None:
+            error = getattr(result, "result", None)
+            raise RuntimeError(
+                f"{type(result).__name__} (message={getattr(error, 'message', None)}, "
+                f"error_code={getattr(error, 'error_code', None)})"
+            )
+        for item in items:
+            yield item
+        total_pages = getattr(result, "total_pages", None)
+        if not items or (total_pages and page >= total_pages) or len(items) < page_size:
+            break
+        page += 1
+
+
+def map_comment_ids_to_rows(smartsheet_client, sheet_id, page_size=1000):
+    """Return comment ID → row ID for every row-level discussion comment on a sheet."""
+    comment_rows = {}
+    discussions = _iter_index_pages(
+        lambda **paging: smartsheet_client.Discussions.get_all_discussions(sheet_id, include="comments", **paging),
+        page_size,
+    )
+    for discussion in discussions:
+        if str(getattr(discussion, "parent_type", "")).upper() != "ROW":
+            continue
+        for comment in getattr(discussion, "comments", None) or []:
+            comment_rows[comment.id] = discussion.parent_id
+    return comment_rows
+
+
+def discover_sheet_attachments(smartsheet_client, sheet_id, page_size=1000):
+    """
+    List every attachment on a sheet with paginated sheet-level calls and group them by parent row.
+    Discussion attachments are resolved to their row; sheet-level attachments are not row files and are skipped.
+    Returns an ordered dict of row ID → list of attachments.
+    """
+    attachments_by_row = {}
+    comment_attachments = []
+    sheet_level_count = 0
+    listing = _iter_index_pages(
+        lambda **paging: smartsheet_client.Attachments.list_all_attachments(sheet_id, **paging),
+        page_size,
+    )
+    for attachment in listing:
+        parent_type = str(getattr(attachment, "parent_type", "")).upper()
+        if parent_type == "ROW":
+            attachments_by_row.setdefault(attachment.parent_id, []).append(attachment)
+        elif parent_type == "COMMENT":
+            comment_attachments.append(attachment)
+        else:
+            sheet_level_count += 1
+
+    if comment_attachments:
+        comment_rows = map_comment_ids_to_rows(smartsheet_client, sheet_id, page_size=page_size)
+        for attachment in comment_attachments:
+            row_id = comment_rows.get(attachment.parent_id)
+            if row_id is None:
+                sheet_level_count += 1
+                continue
+            attachments_by_row.setdefault(row_id, []).append(attachment)
+
+    if sheet_level_count:
+        print(f"Skipped {sheet_level_count} sheet-level attachment(s) on sheet {sheet_id}; only row files are archived.")
+    return attachments_by_row
+
+
 def access_config_file(key):
     import config
     config_value = config.get_credential(key)
@@ -319,60 +661,76 @@ def format_row_id(value):
     except (TypeError, ValueError):
         return str(value)
 
+def sheet_export_path(sheet_id, create=True):
+    """Known location of a sheet's Excel export: resource/sheets/{sheet_id}/{sheet_id}.xlsx."""
+    return os.path.join(sheet_folder_path(sheet_id, create=create), f"{sheet_id}.xlsx")
+
+
+def partial_file_path(final_path):
+    """Sibling path used while a file is being written; keeps the extension so writers accept it."""
+    root, ext = os.path.splitext(final_path)
+    return f"{root}.part{ext}"
+
+
 def download_smartsheet_as_excel(sheet_id):
-    """Downloads a Smartsheet as an Excel file and adds the Row ID column efficiently."""
+    """
+    Downloads a Smartsheet as Excel straight to resource/sheets/{sheet_id}/{sheet_id}.xlsx.
+    The response is streamed into a partial file and renamed into place, so later stages
+    never see a half-written export and need no polling.
+    """
     smartsheet_client = get_smartsheet_client()
     try:
         # Define folders and paths under resource/sheets
         sheet_folder = sheet_folder_path(sheet_id)
+        target_path = sheet_export_path(sheet_id)
+        partial_path = partial_file_path(target_path)
         report_current_work(
             note="Downloading Smartsheet export",
             folder=sheet_folder,
-            file=f"{sheet_id}.xlsx",
+            file=target_path,
         )
 
-        # Download Excel and save it
-        excel_data = smartsheet_client.Sheets.get_sheet_as_excel(sheet_id, sheet_folder)
-        excel_data.save_to_file()  # Save file in the directory
-        latest_file = wait_for_excel_file(sheet_folder, retries=10, delay=1)
-        if latest_file:
-            target_path = os.path.join(sheet_folder, f"{sheet_id}.xlsx")
-            if os.path.abspath(latest_file) != os.path.abspath(target_path):
-                os.replace(latest_file, target_path)
-                print(f"Renamed Excel file to {target_path}")
-            report_current_work(
-                note="Downloaded Smartsheet export",
-                folder=sheet_folder,
-                file=target_path,
+        excel_data = smartsheet_client.Sheets.get_sheet_as_excel(
+            sheet_id,
+            sheet_folder,
+            alternate_file_name=os.path.basename(partial_path),
+        )
+        if not hasattr(excel_data, "save_to_file"):
+            error = getattr(excel_data, "result", None)
+            raise RuntimeError(
+                f"export returned {type(excel_data).__name__} "
+                f"(message={getattr(error, 'message', None)}, error_code={getattr(error, 'error_code', None)})"
             )
-        print(f"Smartsheet {sheet_id} downloaded")
-        return None
+        # Newer SDK releases stream to disk inside get_sheet_as_excel; older ones leave it to the caller.
+        if not os.path.exists(partial_path):
+            excel_data.save_to_file()
+        os.replace(partial_path, target_path)
+        charge_staged_file(sheet_id, target_path)
+        metrics.record_download(
+            metrics.url_host(get_smartsheet_api_base()), os.path.getsize(target_path)
+        )
+
+        report_current_work(
+            note="Downloaded Smartsheet export",
+            folder=sheet_folder,
+            file=target_path,
+        )
+        print(f"Smartsheet {sheet_id} downloaded to {target_path}")
+        return target_path
 
     except Exception as e:
         print(f"Error downloading Smartsheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "download", e)
+        partial_path = partial_file_path(sheet_export_path(sheet_id, create=False))
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
         return None
-    
 
-def wait_for_excel_file(sheet_folder, retries=100, delay=2):
-    """Waits until the Excel file appears in the specified folder."""
-    while retries > 0:
-        excel_files = glob.glob(os.path.join(sheet_folder, "*.xlsx"))
-        if excel_files:
-            excel_files.sort(key=os.path.getmtime, reverse=True)
-            return excel_files[0]  # Return the most recent file
-        print(" Waiting for Excel file to be available...")
-        time.sleep(delay)
-        retries -= 1
-    print(f" No Excel file found in {sheet_folder} after waiting.")
-    return None
 
 def fetch_smartsheet_row_ids(sheet_id):
     """Fetches all row IDs from Smartsheet and returns a row number to row ID mapping."""
     try:
-        smartsheet_client = get_smartsheet_client()
-        row_mapping = {}
-        for row in iter_sheet_rows(smartsheet_client, sheet_id):
-            row_mapping[row.row_number] = row.id  # Map row number → row ID
+        row_mapping = {row.row_number: row.row_id for row in get_sheet_row_snapshot(sheet_id)}  # Map row number → row ID
 
         print(f" Retrieved {len(row_mapping)} Smartsheet row IDs for Sheet {sheet_id}")
         return row_mapping
@@ -382,84 +740,132 @@ def fetch_smartsheet_row_ids(sheet_id):
         return {}
     
 
+COMMENT_COLUMNS = ["Relative Row", "Comments", "Created By", "Created On", "Actual Row ID"]
+
+
+def use_streaming_prepare(sheet_id):
+    """
+    Decide whether the data tab is rewritten row by row instead of through a DataFrame.
+    SHEET_PREPARE_MODE is "dataframe", "streaming" or "auto" (stream once the sheet
+    reaches SHEET_STREAMING_ROW_THRESHOLD rows).
+    """
+    mode = (config.get_credential("SHEET_PREPARE_MODE") or "auto").strip().lower()
+    if mode in ("dataframe", "streaming"):
+        return mode == "streaming"
+    threshold = config.get_int_credential("SHEET_STREAMING_ROW_THRESHOLD", 20000, minimum=0)
+    return len(get_sheet_row_snapshot(sheet_id)) >= threshold
+
+
+def load_sheet_workbook(sheet_id):
+    """
+    Parse the downloaded export once per sheet and keep the DataFrames in the sheet state.
+    Returns a dict with the export path, the data tab (name and DataFrame) and the raw
+    Comments tab (header=None, or None when the export has no Comments tab).
+    When the sheet is prepared in streaming mode the data tab is not loaded ("data" is None).
+    """
+    state = get_sheet_state(sheet_id)
+    workbook = state.get("workbook")
+    if workbook is not None:
+        return workbook
+
+    excel_path = sheet_export_path(sheet_id)
+    if not os.path.exists(excel_path):
+        return None
+
+    with pd.ExcelFile(excel_path, engine="openpyxl") as xls:
+        data_sheet_name = xls.sheet_names[0]  # Assume first sheet contains data
+        df_data = None
+        if not use_streaming_prepare(sheet_id):
+            df_data = pd.read_excel(xls, sheet_name=data_sheet_name)
+        df_comments = None
+        if "Comments" in xls.sheet_names:
+            df_comments = pd.read_excel(xls, sheet_name="Comments", header=None)
+
+    workbook = {
+        "path": excel_path,
+        "data_sheet_name": data_sheet_name,
+        "data": df_data,
+        "comments": df_comments,
+    }
+    state["workbook"] = workbook
+    if df_data is None:
+        print(f"Parsed workbook for sheet {sheet_id}; data tab left for streaming preparation")
+    else:
+        print(f"Parsed workbook for sheet {sheet_id}: {len(df_data)} data rows")
+    return workbook
+
+
+def _label_comment_columns(df_comments):
+    """Trim the raw Comments tab to the known columns and assign headers to the ones present."""
+    df_comments = df_comments.iloc[:, :len(COMMENT_COLUMNS)].copy()  # Trim extra columns
+    df_comments.columns = COMMENT_COLUMNS[:df_comments.shape[1]]  # Assign only existing columns
+    return df_comments
+
+
+def save_intermediate_frame(sheet_id, name, df):
+    """Keep an intermediate table (comments, row mapping) in the sheet state for the later stages; never written as xlsx."""
+    get_sheet_state(sheet_id)[name] = df
+
+
+def load_intermediate_frame(sheet_id, name):
+    """Return an intermediate table kept by an earlier stage of this sheet, or None."""
+    return get_sheet_state(sheet_id).get(name)
+
+
 # Extract & Store Comments
 def extract_and_store_comments(sheet_id):
-    """Reads Smartsheet Excel, extracts comments, and stores them row-wise."""
+    """Extracts comments from the parsed Smartsheet workbook and keeps them row-wise in the sheet state."""
     try:
-        # Find the downloaded Excel file
-        sheet_folder = sheet_folder_path(sheet_id)
-        excel_files = glob.glob(os.path.join(sheet_folder, "*.xlsx"))
-        if not excel_files:
-            print(f"Smartsheet Excel not found in {sheet_folder}")
-            return
+        workbook = load_sheet_workbook(sheet_id)
+        if workbook is None:
+            print(f"Smartsheet Excel not found in {sheet_folder_path(sheet_id)}")
+            return None
+        if workbook["comments"] is None:
+            print(f"No 'Comments' sheet found for {sheet_id}")
+            return None
 
-        excel_path = excel_files[0]
-        comments_folder = comments_folder_path(sheet_id)
         report_current_work(
             note="Extracting comments",
-            folder=comments_folder,
+            folder=comments_folder_path(sheet_id),
             file=f"{sheet_id}_comments.xlsx",
         )
 
-        original_file = wait_for_excel_file(sheet_folder, retries=100, delay=2)  # Use the first (and only) file
-
-        # Load Excel into Pandas safely
-        with pd.ExcelFile(original_file, engine="openpyxl") as xls:
-            df_comments = pd.read_excel(xls, sheet_name="Comments", header=None)
-
         # Dynamically assign headers (Fixes length mismatch error)
-        expected_columns = ["Relative Row", "Comments", "Created By", "Created On", "Actual Row ID"]
-        df_comments = df_comments.iloc[:, :len(expected_columns)]  # Trim extra columns
-        df_comments.columns = expected_columns[:df_comments.shape[1]]  # Assign only existing columns
+        df_comments = _label_comment_columns(workbook["comments"])
         df_comments = df_comments.dropna(how='all')
         df_comments['Relative Row']= df_comments['Relative Row'].ffill()
         if "Actual Row ID" in df_comments.columns:
             df_comments["Actual Row ID"] = df_comments["Actual Row ID"].map(format_row_id)
-        df_comments.to_excel(f"{comments_folder}/{sheet_id}_comments.xlsx", index=False)
 
-        report_current_work(
-            note="Saved comments",
-            folder=comments_folder,
-            file=f"{comments_folder}/{sheet_id}_comments.xlsx",
-        )
-
-        print(f"Saved comments to {comments_folder}/{sheet_id}_comments.xlsx")
+        save_intermediate_frame(sheet_id, "comments", df_comments)
+        print(f"Extracted {len(df_comments)} comments for sheet {sheet_id}")
+        return df_comments
 
     except Exception as e:
         print(f"Error extracting comments for Sheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "comments", e)
+        return None
 
 
 
 def create_relative_row_mapping(sheet_id):
     """Creates a mapping table of 'Relative Row' to 'Actual Row ID' from Smartsheet comments data."""
     try:
-        # Find the downloaded Smartsheet Excel file
-        sheet_folder = sheet_folder_path(sheet_id)
-        mapping_folder = row_mapping_folder_path(sheet_id)
-        excel_files = glob.glob(os.path.join(sheet_folder, "*.xlsx"))
-
-        if not excel_files:
-            print(f"Smartsheet Excel not found in {sheet_folder}")
+        workbook = load_sheet_workbook(sheet_id)
+        if workbook is None:
+            print(f"Smartsheet Excel not found in {sheet_folder_path(sheet_id)}")
             return None
 
-        original_file = wait_for_excel_file(sheet_folder, retries=100, delay=2)
-
-        # Load Excel into Pandas Safely
-        with pd.ExcelFile(original_file, engine="openpyxl") as xls:
-            df_comments = pd.read_excel(xls, sheet_name="Comments", header=None)
-
-        if "Comments" not in xls.sheet_names:
-            print(f"No 'Comments' sheet found in {sheet_folder}")
+        if workbook["comments"] is None:
+            print(f"No 'Comments' sheet found for {sheet_id}")
             return None
-        
-        if df_comments.empty:
+
+        if workbook["comments"].empty:
             print(f"No comments found in 'Comments' sheet for {sheet_id}.")
             return None
 
         # Assign headers dynamically (Handle missing headers)
-        expected_columns = ["Relative Row", "Comments", "Created By", "Created On", "Actual Row ID"]
-        df_comments = df_comments.iloc[:, :len(expected_columns)]  # Trim extra columns
-        df_comments.columns = expected_columns[:df_comments.shape[1]]  # Assign headers
+        df_comments = _label_comment_columns(workbook["comments"])
 
         # Fetch Smartsheet row IDs from API
         row_mapping = fetch_smartsheet_row_ids(sheet_id)
@@ -478,30 +884,62 @@ def create_relative_row_mapping(sheet_id):
         # Convert to DataFrame
         df_mapping = pd.DataFrame(mapping_table.items(), columns=["Relative Row", "Row ID"])
         df_mapping["Row ID"] = df_mapping["Row ID"].map(format_row_id)
+        save_intermediate_frame(sheet_id, "row_mapping", df_mapping)
 
-        # Save to file
-        mapping_path = os.path.join(mapping_folder, f"{sheet_id}_relative_row_mapping.xlsx")
-        df_mapping.to_excel(mapping_path, index=False)
-
-        report_current_work(
-            note="Saved row mapping",
-            folder=mapping_folder,
-            file=mapping_path,
-        )
-        print(f" Created Relative Row → Row ID mapping table: {mapping_path}")
+        print(f" Created Relative Row → Row ID mapping table for sheet {sheet_id} ({len(df_mapping)} rows)")
         return df_mapping
 
     except Exception as e:
         print(f" Error creating mapping table for Sheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "row_mapping", e)
         return None
     
 
 
+def _stream_prepare_sheet(sheet_id, export_path, partial_path):
+    """
+    Rewrite the data tab row by row, appending Row ID and Filename, into partial_path.
+    Reads with a read-only workbook and writes with a write-only one so memory stays flat.
+    Trailing blank rows are dropped (as pandas does); blank rows between data rows keep their Row ID.
+    Returns the number of data rows written, or None when cancelled.
+    """
+    snapshot = get_sheet_row_snapshot(sheet_id)
+    filename = f"{sheet_id}.xlsx"
+    source = load_workbook(export_path, read_only=True, data_only=True)
+    target = Workbook(write_only=True)
+    try:
+        source_rows = source.worksheets[0].iter_rows(values_only=True)
+        output = target.create_sheet(title="Sheet1")
+        header = next(source_rows, None) or ()
+        output.append(list(header) + ["Row ID", "Filename"])
+
+        written = 0
+        next_cancel_check = 5000
+        blank_rows = []
+        for values in source_rows:
+            if all(value is None for value in values):
+                blank_rows.append(values)
+                continue
+            for row_values in blank_rows + [values]:
+                row_id = format_row_id(snapshot[written].row_id) if written < len(snapshot) else ""
+                output.append(list(row_values) + [row_id, filename])
+                written += 1
+            blank_rows = []
+            if written >= next_cancel_check:
+                next_cancel_check += 5000
+                if process_state.is_cancel_requested():
+                    print(f"Cancellation requested while preparing sheet {sheet_id}.")
+                    return None
+
+        target.save(partial_path)
+        return written
+    finally:
+        source.close()
+
+
 def prepare_sheet_for_drive_upload(sheet_id):
     """Adds Row ID and Filename columns to the downloaded Excel file for Google Drive upload."""
-    original_file = None
     try:
-        smartsheet_client = get_smartsheet_client()
         # ? Define folders and paths
         sheet_folder = sheet_folder_path(sheet_id)
         report_current_work(
@@ -510,20 +948,31 @@ def prepare_sheet_for_drive_upload(sheet_id):
             file=f"{sheet_id}.xlsx",
         )
 
-        original_file = wait_for_excel_file(sheet_folder, retries=100, delay=2)  # Use the first (and only) file
-        if not original_file:
+        workbook = load_sheet_workbook(sheet_id)
+        if workbook is None:
             print(f"No Excel file found for sheet {sheet_id} to prepare for Drive upload.")
             return None
+        export_path = workbook["path"]
+        df = workbook["data"]
+        partial_path = partial_file_path(export_path)
+
+        if df is None:
+            # ? Large sheet: copy rows through read-only/write-only workbooks with flat memory
+            written = _stream_prepare_sheet(sheet_id, export_path, partial_path)
+            if written is None:
+                return None
+            replace_staged_file(sheet_id, partial_path, export_path)
+            get_sheet_state(sheet_id).pop("workbook", None)
+            report_current_work(
+                note="Prepared sheet for Drive upload",
+                folder=sheet_folder,
+                file=export_path,
+            )
+            print(f"Streamed {written} rows into {export_path}")
+            return export_path
 
-        # ? Load Excel into Pandas Safely
-        with pd.ExcelFile(original_file, engine="openpyxl") as xls:
-            sheet_name = xls.sheet_names[0]  # Assume first sheet contains data
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-
-        # ? Fetch Smartsheet Row IDs in bulk (Efficient)
-        row_records = [(row.row_number, row.id) for row in iter_sheet_rows(smartsheet_client, sheet_id)]
-        row_records.sort(key=lambda pair: pair[0])
-        row_ids = [format_row_id(row_id) for _, row_id in row_records]
+        # ? Row IDs come from the shared row snapshot (already sorted by row number)
+        row_ids = [format_row_id(row.row_id) for row in get_sheet_row_snapshot(sheet_id)]
         if len(row_ids) < len(df):
             row_ids.extend([""] * (len(df) - len(row_ids)))
         df["Row ID"] = row_ids[:len(df)]
@@ -531,82 +980,75 @@ def prepare_sheet_for_drive_upload(sheet_id):
         # ? Add "Filename" column
         df["Filename"] = f"{sheet_id}.xlsx"
 
-        # ? Save the updated file
-        updated_excel_path = os.path.join(sheet_folder, f"{sheet_id}.xlsx")
-        df.to_excel(updated_excel_path, index=False)
+        # ? Write the updated file next to the export and swap it in atomically
+        df.to_excel(partial_path, index=False)
+        replace_staged_file(sheet_id, partial_path, export_path)
+        # The export on disk has been rewritten; release the parsed copy.
+        get_sheet_state(sheet_id).pop("workbook", None)
 
         report_current_work(
             note="Prepared sheet for Drive upload",
             folder=sheet_folder,
-            file=updated_excel_path,
+            file=export_path,
         )
-        # ? Delete the original downloaded file after modification
-        if os.path.exists(original_file) and os.path.abspath(original_file) != os.path.abspath(updated_excel_path):
-            os.remove(original_file)
-        print(f"Replaced original Excel file with {updated_excel_path}")
-        return updated_excel_path, original_file
+        print(f"Replaced original Excel file with {export_path}")
+        return export_path
 
     except Exception as e:
         print(f"Error preparing Excel for Google Drive upload for sheet {sheet_id}: {e}")
-        # Fallback: attempt to rename the original download so it is still usable
-        try:
-            if original_file and os.path.exists(original_file):
-                fallback_path = os.path.join(sheet_folder_path(sheet_id), f"{sheet_id}.xlsx")
-                os.replace(original_file, fallback_path)
-                print(f"Fallback: renamed {original_file} to {fallback_path} after error.")
-                return fallback_path, original_file
-        except Exception as rename_err:
-            print(f"Fallback rename failed for sheet {sheet_id}: {rename_err}")
+        mark_stage_failed(sheet_id, "prepare_sheet", e)
+        # Fallback: the untouched export is still in place and will be uploaded as-is
+        partial_path = partial_file_path(sheet_export_path(sheet_id, create=False))
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
 
 
 def merge_comments_with_row_mapping(sheet_id):
-    """Merges the comments table with row mapping table using wildcard search."""
+    """
+    Merges the comments table with the row mapping table and writes the final xlsx artifacts:
+    the merged comments file and the relative row mapping file.
+    """
     try:
-        # Define the folder path
+        df_comments = load_intermediate_frame(sheet_id, "comments")
+        df_mapping = load_intermediate_frame(sheet_id, "row_mapping")
         comments_folder = comments_folder_path(sheet_id)
-        row_mapping_folder = row_mapping_folder_path(sheet_id)
-        
-        # Find the comments file using wildcard
-        comments_files = glob.glob(os.path.join(comments_folder, f"{sheet_id}*_comments.xlsx"))
-        mapping_files = glob.glob(os.path.join(row_mapping_folder, f"{sheet_id}*_relative_row_mapping.xlsx"))
-        
-        if not comments_files or not mapping_files:
-            print(f"Comments or mapping file not found in {comments_folder} or in {row_mapping_folder}")
+
+        if df_comments is None:
+            print(f"No extracted comments for sheet {sheet_id}; nothing to merge.")
             return None
-        
-        comments_file = comments_files[0]
-        mapping_file = mapping_files[0]
-        
-        # Load the comments and mapping data
-        df_comments = pd.read_excel(comments_file)
-        df_mapping = pd.read_excel(mapping_file)
-        
-        # Ensure correct column names before merging
-        df_comments.rename(columns={
-            df_comments.columns[0]: "Relative Row",
-            df_comments.columns[1]: "Comments",
-            df_comments.columns[2]: "Created By",
-            df_comments.columns[3]: "Created On"
-        }, inplace=True)
-        df_comments["Relative Row"] = df_comments["Relative Row"].astype(str).str.extract(r"(\d+)").astype(float).astype("Int64")
-      
-        
-        df_mapping.rename(columns={
-            df_mapping.columns[0]: "Relative Row",
-            df_mapping.columns[1]: "Row ID"
-        }, inplace=True)
-        df_mapping['Relative Row'] = df_mapping['Relative Row'].astype("Int64")
-        df_mapping["Row ID"] = df_mapping["Row ID"].map(format_row_id)
-        
-        # Merge comments with row mapping
-        df_merged = df_comments.merge(df_mapping, on="Relative Row", how="left")
-        
+
+        df_merged = df_comments.copy()
+        df_merged["Relative Row"] = df_merged["Relative Row"].astype(str).str.extract(r"(\d+)").astype(float).astype("Int64")
+
+        if df_mapping is not None:
+            # Save the row mapping artifact (archived under rowmapping/)
+            mapping_folder = row_mapping_folder_path(sheet_id)
+            mapping_path = os.path.join(mapping_folder, f"{sheet_id}_relative_row_mapping.xlsx")
+            df_mapping.to_excel(mapping_path, index=False)
+            charge_staged_file(sheet_id, mapping_path)
+            report_current_work(
+                note="Saved row mapping",
+                folder=mapping_folder,
+                file=mapping_path,
+            )
+
+            df_mapping = df_mapping.copy()
+            df_mapping['Relative Row'] = df_mapping['Relative Row'].astype("Int64")
+            df_mapping["Row ID"] = df_mapping["Row ID"].map(format_row_id)
+
+            # Merge comments with row mapping
+            df_merged = df_merged.merge(df_mapping, on="Relative Row", how="left")
+        else:
+            print(f"Row mapping not available for sheet {sheet_id}; saving comments without Row ID.")
+
         # Add Sheet ID column
         df_merged.insert(0, "Sheet ID", sheet_id)
         
-        # Save the updated comments table
+        # Save the final comments table
         merged_file_path = os.path.join(comments_folder, f"{sheet_id}_comments.xlsx")
         df_merged.to_excel(merged_file_path, index=False)
+        charge_staged_file(sheet_id, merged_file_path)
 
         report_current_work(
             note="Merged comments",
@@ -617,44 +1059,126 @@ def merge_comments_with_row_mapping(sheet_id):
         return merged_file_path
     except Exception as e:
         print(f"Error merging comments with row mapping for {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "merge_comments", e)
         return None
 
+# Process-wide (parent folder ID, folder name) → Drive folder ID cache shared by every sheet and job.
+# Bounded LRU with a TTL; entries are invalidated when Drive reports a cached folder as missing.
+DRIVE_FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+_DRIVE_FOLDER_CACHE_LOCK = threading.Lock()
+_DRIVE_FOLDER_CACHE = OrderedDict()
+# Fixed stripe of creation locks: (parent, name) keys hash onto them, so memory stays bounded however many folders are seen.
+_DRIVE_FOLDER_KEY_LOCKS = [threading.Lock() for _ in range(256)]
+
+
+def get_cached_drive_folder(folder_name, parent_folder_id):
+    ttl_seconds = config.get_int_credential("DRIVE_FOLDER_CACHE_TTL_SECONDS", 86400, minimum=0)
+    key = (parent_folder_id, folder_name)
+    with _DRIVE_FOLDER_CACHE_LOCK:
+        entry = _DRIVE_FOLDER_CACHE.get(key)
+        if entry is None:
+            return None
+        folder_id, cached_at = entry
+        if ttl_seconds and time.monotonic() - cached_at > ttl_seconds:
+            del _DRIVE_FOLDER_CACHE[key]
+            return None
+        _DRIVE_FOLDER_CACHE.move_to_end(key)
+        return folder_id
+
+
+def cache_drive_folder(folder_name, parent_folder_id, folder_id):
+    max_entries = config.get_int_credential("DRIVE_FOLDER_CACHE_SIZE", 10000, minimum=1)
+    key = (parent_folder_id, folder_name)
+    with _DRIVE_FOLDER_CACHE_LOCK:
+        _DRIVE_FOLDER_CACHE[key] = (folder_id, time.monotonic())
+        _DRIVE_FOLDER_CACHE.move_to_end(key)
+        while len(_DRIVE_FOLDER_CACHE) > max_entries:
+            _DRIVE_FOLDER_CACHE.popitem(last=False)
+
+
+def invalidate_drive_folder(folder_id):
+    """Forget a folder that Drive no longer knows, including cached children beneath it."""
+    with _DRIVE_FOLDER_CACHE_LOCK:
+        stale_keys = [
+            key for key, (cached_id, _) in _DRIVE_FOLDER_CACHE.items()
+            if cached_id == folder_id or key[0] == folder_id
+        ]
+        for key in stale_keys:
+            del _DRIVE_FOLDER_CACHE[key]
+    if stale_keys:
+        print(f"Invalidated {len(stale_keys)} cached Drive folder(s) for {folder_id}")
+
+
+def _drive_folder_lock_index(folder_name, parent_folder_id):
+    return hash((parent_folder_id, folder_name)) % len(_DRIVE_FOLDER_KEY_LOCKS)
+
+
+def _drive_folder_key_lock(folder_name, parent_folder_id):
+    """The creation lock for (parent, name), so concurrent workers never create the same folder twice."""
+    return _DRIVE_FOLDER_KEY_LOCKS[_drive_folder_lock_index(folder_name, parent_folder_id)]
+
+
+def _drive_query_literal(value):
+    return str(value).replace("\\", "\\\\").replace("'", "\\'")
+
+
 def get_or_create_drive_folder(folder_name, parent_folder_id):
     """Checks if a folder exists in Google Drive, creates it if not, and returns its ID."""
     try:
-        drive_service, _, _ = get_google_services()
-
         if not parent_folder_id:
             raise ValueError(f"Missing parent folder ID for '{folder_name}'.")
 
-        describe_drive_item(parent_folder_id, f"parent for {folder_name}")
-        print(f"Searching for Drive folder '{folder_name}' under parent {parent_folder_id}")
-        query = f"name='{folder_name}' and '{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder'"
-        results = drive_service.files().list(
-            q=query,
-            fields="files(id)",
-            includeItemsFromAllDrives=True,
-            supportsAllDrives=True,
-        ).execute()
-
-        if results.get("files"):
-            return results["files"][0]["id"]  # ? Return existing folder ID
-
-        # ? Create folder if it doesn't exist
-        file_metadata = {
-            "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-        file_metadata["parents"] = [parent_folder_id]
-        print(f"Creating Drive folder '{folder_name}' under parent {parent_folder_id}")
-        print(f"Creating Drive folder metadata: name={folder_name} parent={parent_folder_id}")
-        folder = drive_service.files().create(
-            body=file_metadata,
-            fields="id",
-            supportsAllDrives=True,
-        ).execute()
-        describe_drive_item(folder["id"], f"created folder {folder_name}")
-        return folder["id"]
+        cached_id = get_cached_drive_folder(folder_name, parent_folder_id)
+        if cached_id:
+            return cached_id
+
+        with _drive_folder_key_lock(folder_name, parent_folder_id):
+            cached_id = get_cached_drive_folder(folder_name, parent_folder_id)
+            if cached_id:
+                return cached_id
+
+            drive_service, _, _ = get_google_services()
+            diagnostics = config.get_bool_credential("DRIVE_DIAGNOSTICS", False)
+            if diagnostics:
+                describe_drive_item(parent_folder_id, f"parent for {folder_name}")
+            print(f"Searching for Drive folder '{folder_name}' under parent {parent_folder_id}")
+            query = (
+                f"name='{_drive_query_literal(folder_name)}' and '{parent_folder_id}' in parents "
+                f"and mimeType='{DRIVE_FOLDER_MIME_TYPE}' and trashed=false"
+            )
+            try:
+                results = drive_service.files().list(
+                    q=query,
+                    fields="files(id)",
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                ).execute()
+            except HttpError as e:
+                if getattr(e.resp, "status", None) == 404:
+                    invalidate_drive_folder(parent_folder_id)
+                raise
+
+            if results.get("files"):
+                folder_id = results["files"][0]["id"]  # ? Return existing folder ID
+                cache_drive_folder(folder_name, parent_folder_id, folder_id)
+                return folder_id
+
+            # ? Create folder if it doesn't exist
+            file_metadata = {
+                "name": folder_name,
+                "mimeType": DRIVE_FOLDER_MIME_TYPE,
+            }
+            file_metadata["parents"] = [parent_folder_id]
+            print(f"Creating Drive folder '{folder_name}' under parent {parent_folder_id}")
+            folder = drive_service.files().create(
+                body=file_metadata,
+                fields="id",
+                supportsAllDrives=True,
+            ).execute()
+            if diagnostics:
+                describe_drive_item(folder["id"], f"created folder {folder_name}")
+            cache_drive_folder(folder_name, parent_folder_id, folder["id"])
+            return folder["id"]
 
     except HttpError as e:
         print(f"Drive folder create failed for {folder_name}: {e}")
@@ -662,12 +1186,128 @@ def get_or_create_drive_folder(folder_name, parent_folder_id):
             print(f"Drive error details: {e.error_details}")
         except Exception:
             pass
+        if parent_folder_id and not config.get_bool_credential("DRIVE_DIAGNOSTICS", False):
+            describe_drive_item(parent_folder_id, f"parent for {folder_name}")
         raise
     except Exception as e:
         print(f"Error creating Google Drive folder {folder_name}: {e}")
         return None
 
 
+DRIVE_BATCH_LIMIT = 100  # Drive accepts at most 100 calls per HTTP batch request
+
+
+def list_drive_child_folders(parent_folder_id):
+    """List every folder directly under a parent (paged) and seed the folder cache. Returns name → id."""
+    drive_service, _, _ = get_google_services()
+    children = {}
+    page_token = None
+    while True:
+        try:
+            results = drive_service.files().list(
+                q=f"'{parent_folder_id}' in parents and mimeType='{DRIVE_FOLDER_MIME_TYPE}' and trashed=false",
+                fields="nextPageToken, files(id, name)",
+                pageSize=1000,
+                pageToken=page_token,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+            ).execute()
+        except HttpError as e:
+            if getattr(e.resp, "status", None) == 404:
+                invalidate_drive_folder(parent_folder_id)
+            raise
+        for item in results.get("files", []):
+            children.setdefault(item["name"], item["id"])
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+    for folder_name, folder_id in children.items():
+        cache_drive_folder(folder_name, parent_folder_id, folder_id)
+    return children
+
+
+def resolve_drive_folders(folder_names, parent_folder_id):
+    """
+    Resolve many sibling folders under one parent up front and return name → folder ID.
+    Names not already cached are matched against a single paged listing of the parent;
+    the rest are created through Drive HTTP batch requests (100 per batch). Each batch holds the
+    creation locks of its names and skips any that a concurrent get_or_create_drive_folder cached
+    meanwhile. A folder whose batched create fails falls back to get_or_create_drive_folder.
+    """
+    resolved = {}
+    uncached = []
+    for folder_name in dict.fromkeys(str(name) for name in folder_names):
+        cached_id = get_cached_drive_folder(folder_name, parent_folder_id)
+        if cached_id:
+            resolved[folder_name] = cached_id
+        else:
+            uncached.append(folder_name)
+    if not uncached:
+        return resolved
+
+    existing = list_drive_child_folders(parent_folder_id)
+    missing = []
+    for folder_name in uncached:
+        if folder_name in existing:
+            resolved[folder_name] = existing[folder_name]
+        else:
+            missing.append(folder_name)
+    print(
+        f"Resolved {len(resolved)} Drive folder(s) under {parent_folder_id}; "
+        f"creating {len(missing)} in batches"
+    )
+
+    drive_service, _, _ = get_google_services()
+    failed = []
+
+    def on_created(request_id, response, exception):
+        folder_name = missing[int(request_id)]
+        if exception is not None:
+            print(f"Batched create failed for Drive folder '{folder_name}': {exception}")
+            failed.append(folder_name)
+            return
+        resolved[folder_name] = response["id"]
+        cache_drive_folder(folder_name, parent_folder_id, response["id"])
+
+    for start in range(0, len(missing), DRIVE_BATCH_LIMIT):
+        if process_state.is_cancel_requested():
+            return resolved
+        indexes = range(start, min(start + DRIVE_BATCH_LIMIT, len(missing)))
+        # Locks are always taken in stripe order, so two batches can never deadlock each other.
+        lock_indexes = sorted({_drive_folder_lock_index(missing[index], parent_folder_id) for index in indexes})
+        with ExitStack() as held_locks:
+            for lock_index in lock_indexes:
+                held_locks.enter_context(_DRIVE_FOLDER_KEY_LOCKS[lock_index])
+            batch = drive_service.new_batch_http_request(callback=on_created)
+            batched = 0
+            for index in indexes:
+                cached_id = get_cached_drive_folder(missing[index], parent_folder_id)
+                if cached_id:
+                    resolved[missing[index]] = cached_id
+                    continue
+                batch.add(
+                    drive_service.files().create(
+                        body={
+                            "name": missing[index],
+                            "mimeType": DRIVE_FOLDER_MIME_TYPE,
+                            "parents": [parent_folder_id],
+                        },
+                        fields="id",
+                        supportsAllDrives=True,
+                    ),
+                    request_id=str(index),
+                )
+                batched += 1
+            if batched:
+                batch.execute()
+
+    for folder_name in failed:
+        folder_id = get_or_create_drive_folder(folder_name, parent_folder_id)
+        if folder_id:
+            resolved[folder_name] = folder_id
+    return resolved
+
+
 def ensure_drive_folder_path(folder_parts, root_folder_id, folder_cache=None):
     """Ensure a nested Drive folder path exists and return the final folder ID."""
     folder_cache = folder_cache if folder_cache is not None else {}
@@ -688,9 +1328,262 @@ def ensure_drive_folder_path(folder_parts, root_folder_id, folder_cache=None):
     return current_parent_id
 
 
-def upload_file_to_drive_parent(drive_service, file_path, parent_folder_id, *, note, folder=None):
-    """Upload a single local file to a specific Drive folder."""
-    mime_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"userRateLimitExceeded", "rateLimitExceeded"}
+
+
+def is_transient_drive_error(exc):
+    """
+    True for Drive errors worth retrying: 429/5xx, 403 rate limits and dropped connections or timeouts.
+    Other OSErrors (missing or unreadable local files, a full disk, requests' exceptions) are not retried.
+    """
+    if isinstance(exc, HttpError):
+        status = getattr(exc.resp, "status", None)
+        if status in TRANSIENT_HTTP_STATUSES:
+            return True
+        if status == 403:
+            try:
+                reasons = {detail.get("reason") for detail in exc.error_details or []}
+            except Exception:
+                reasons = set()
+            return bool(reasons & RATE_LIMIT_REASONS)
+        return False
+    return isinstance(exc, (ConnectionError, TimeoutError, socket.timeout, socket.gaierror, httplib2.HttpLib2Error))
+
+
+def is_drive_throttle_error(exc):
+    """
+    True for Drive responses that signal quota pressure (429, 5xx, 403 rate limits): only these
+    shrink the upload concurrency window. Dropped connections are retried without shrinking it.
+    """
+    return isinstance(exc, HttpError) and is_transient_drive_error(exc)
+
+
+def _drive_error_reason(exc):
+    """Short label for a retried Drive error: the HTTP status, or the exception type for dropped connections."""
+    if isinstance(exc, HttpError):
+        return str(getattr(exc.resp, "status", "error"))
+    return type(exc).__name__
+
+
+def _drive_host(drive_service):
+    return metrics.url_host(getattr(drive_service, "_baseUrl", "") or "")
+
+
+def execute_drive_upload(drive_service, file_path, file_metadata, mime_type, on_throttle=None):
+    """
+    Shared upload engine for every local file sent to Drive. Returns the new file ID,
+    or None when the job is cancelled mid-upload.
+
+    Files smaller than DRIVE_RESUMABLE_THRESHOLD_MB go up in one request; transient errors are
+    raised so the caller can retry the whole (small) file. Larger files use a resumable session
+    sent in DRIVE_UPLOAD_CHUNK_MB chunks: cancellation is checked between chunks, and after a
+    transient error the next call resumes from the last byte Drive acknowledged, up to
+    DRIVE_UPLOAD_MAX_RETRIES consecutive failures. Quota errors are also reported to `on_throttle`.
+    """
+    threshold_bytes = config.get_int_credential("DRIVE_RESUMABLE_THRESHOLD_MB", 5, minimum=0) * 1024 * 1024
+    file_size = os.path.getsize(file_path)
+
+    if file_size < threshold_bytes:
+        media = MediaFileUpload(file_path, mimetype=mime_type)
+        file = drive_service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields="id",
+            supportsAllDrives=True,
+        ).execute()
+        return file.get("id")
+
+    # Drive requires chunk sizes in multiples of 256 KB; whole MB values always are.
+    chunk_size = config.get_int_credential("DRIVE_UPLOAD_CHUNK_MB", 8, minimum=1) * 1024 * 1024
+    media = MediaFileUpload(file_path, mimetype=mime_type, chunksize=chunk_size, resumable=True)
+    request = drive_service.files().create(
+        body=file_metadata,
+        media_body=media,
+        fields="id",
+        supportsAllDrives=True,
+    )
+    return run_resumable_upload(request, file_path, on_throttle)
+
+
+def run_resumable_upload(request, label, on_throttle=None):
+    """
+    Drive a resumable upload request to completion, chunk by chunk. Returns the file ID, or None
+    when the job is cancelled between chunks. Transient errors resume from the last acknowledged byte;
+    quota errors are also reported to `on_throttle`.
+    """
+    max_retries = config.get_int_credential("DRIVE_UPLOAD_MAX_RETRIES", 5, minimum=0)
+    response = None
+    failures = 0
+    while response is None:
+        if process_state.is_cancel_requested():
+            print(f"Cancellation requested; stopped resumable upload of {label}.")
+            return None
+        try:
+            status, response = request.next_chunk()
+        except Exception as exc:
+            if not is_transient_drive_error(exc) or failures >= max_retries:
+                raise
+            if on_throttle is not None and is_drive_throttle_error(exc):
+                on_throttle()
+            failures += 1
+            metrics.record_retry(metrics.url_host(request.uri), _drive_error_reason(exc))
+            delay = min(2 ** failures, 60) + random.uniform(0, 1)
+            print(f"Transient error uploading {label} ({exc}); resuming in {delay:.1f}s (attempt {failures}/{max_retries})")
+            time.sleep(delay)
+            continue
+        failures = 0
+        if status is not None:
+            print(f"Uploaded {int(status.progress() * 100)}% of {label}")
+    return response.get("id")
+
+
+class AttachmentSourceError(RuntimeError):
+    """The download feeding a streamed Drive upload failed or came up short; the upload cannot be resumed."""
+
+
+class ResponseStreamUpload(MediaUpload):
+    """
+    Resumable media body read straight from an HTTP response (a pre-signed attachment URL).
+    Only bytes Drive has not acknowledged yet are buffered, so memory stays around one upload
+    chunk per file; a resumed chunk is served again from that buffer. A failed read from the
+    response raises AttachmentSourceError, which is never retried: the spent response cannot be
+    read again, and treating it as end of file would finalize a truncated Drive file.
+    """
+
+    def __init__(self, response, mimetype, chunksize, size=None):
+        super().__init__()
+        self._pieces = response.iter_content(chunk_size=256 * 1024)
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._size = size
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._exhausted = False
+        self.bytes_read = 0
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        if begin < self._buffer_start:
+            raise RuntimeError(f"Cannot rewind attachment stream to byte {begin}; {self._buffer_start} already released.")
+        # Everything before `begin` has been acknowledged by Drive and can be dropped.
+        del self._buffer[: begin - self._buffer_start]
+        self._buffer_start = begin
+        while len(self._buffer) < length and not self._exhausted:
+            try:
+                piece = next(self._pieces)
+            except StopIteration:
+                self._exhausted = True
+                break
+            except Exception as exc:
+                raise AttachmentSourceError(f"Attachment download failed after {self.bytes_read} bytes: {exc}") from exc
+            self._buffer.extend(piece)
+            self.bytes_read += len(piece)
+        return bytes(self._buffer[:length])
+
+
+def stream_response_to_drive(response, file_name, mime_type, parent_folder_id, on_throttle=None):
+    """
+    Pipe a download response into a new Drive file without touching local disk.
+    Returns (file_id, bytes_sent); file_id is None when the job was cancelled mid-upload.
+    Raises AttachmentSourceError if the download fails, or ends short of its Content-Length
+    (the truncated Drive file is deleted first).
+    """
+    drive_service, _, _ = get_google_services()
+    file_metadata = {"name": file_name, "mimeType": mime_type, "parents": [parent_folder_id]}
+    size = None
+    if response.headers.get("Content-Length") and not response.headers.get("Content-Encoding"):
+        size = int(response.headers["Content-Length"])
+    if size == 0:
+        media = MediaIoBaseUpload(io.BytesIO(b""), mimetype=mime_type)
+        file = drive_service.files().create(
+            body=file_metadata, media_body=media, fields="id", supportsAllDrives=True
+        ).execute()
+        return file.get("id"), 0
+
+    chunk_size = config.get_int_credential("DRIVE_UPLOAD_CHUNK_MB", 8, minimum=1) * 1024 * 1024
+    media = ResponseStreamUpload(response, mime_type, chunk_size, size)
+    request = drive_service.files().create(
+        body=file_metadata,
+        media_body=media,
+        fields="id",
+        supportsAllDrives=True,
+    )
+    file_id = run_resumable_upload(request, file_name, on_throttle)
+    if file_id and size is not None and media.bytes_read != size:
+        try:
+            drive_service.files().delete(fileId=file_id, supportsAllDrives=True).execute()
+        except Exception as delete_err:
+            print(f"Could not delete truncated Drive file {file_id} for {file_name}: {delete_err}")
+        raise AttachmentSourceError(
+            f"Attachment download ended after {media.bytes_read} of {size} bytes; removed the Drive file."
+        )
+    return file_id, media.bytes_read
+
+
+def _drive_quota_key():
+    """Identify the Drive quota in use: uploads through one credential share one concurrency controller."""
+    auth_type = (_get_google_auth_setting("GOOGLE_AUTH_TYPE", "service_account")).lower()
+    if auth_type == "oauth":
+        return f"oauth:{_get_google_auth_setting('GOOGLE_OAUTH_TOKEN_FILE', 'token.json')}"
+    return f"service_account:{_get_google_auth_setting('GOOGLE_SERVICE_ACCOUNT_FILE', DEFAULT_SERVICE_ACCOUNT_FILE)}"
+
+
+def get_drive_upload_controller():
+    maximum = config.get_int_credential("DRIVE_UPLOAD_MAX_CONCURRENCY", 16, minimum=1)
+    return get_upload_controller(
+        _drive_quota_key(),
+        start=config.get_int_credential("DRIVE_UPLOAD_START_CONCURRENCY", 4, minimum=1),
+        minimum=1,
+        maximum=maximum,
+    )
+
+
+def _upload_to_parent_once(drive_service, file_path, file_metadata, mime_type, resolve_parent, on_throttle):
+    parent_folder_id = file_metadata["parents"][0]
+    try:
+        return execute_drive_upload(drive_service, file_path, file_metadata, mime_type, on_throttle)
+    except HttpError as e:
+        if getattr(e.resp, "status", None) != 404:
+            raise
+        invalidate_drive_folder(parent_folder_id)
+        if resolve_parent is None:
+            raise
+        fresh_parent_id = resolve_parent()
+        if not fresh_parent_id:
+            raise
+        print(f"Parent folder {parent_folder_id} is gone; retrying {file_path} under {fresh_parent_id}")
+        file_metadata["parents"] = [fresh_parent_id]
+        return execute_drive_upload(drive_service, file_path, file_metadata, mime_type, on_throttle)
+
+
+def upload_file_to_drive_parent(
+    drive_service, file_path, parent_folder_id, *, note, folder=None, mime_type=None, resolve_parent=None
+):
+    """
+    Upload a single local file to a specific Drive folder.
+    Each attempt holds a slot of the adaptive upload controller. Rate-limit and 5xx responses shrink
+    the controller's limit; they and dropped connections are retried with backoff, up to
+    DRIVE_UPLOAD_MAX_RETRIES times.
+    If Drive answers 404 (a cached parent folder was deleted), the parent is dropped from the
+    folder cache and, when `resolve_parent` is given, re-resolved once and the upload retried.
+    """
+    mime_type = mime_type or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
     file_metadata = {
         "name": os.path.basename(file_path),
         "mimeType": mime_type,
@@ -701,20 +1594,100 @@ def upload_file_to_drive_parent(drive_service, file_path, parent_folder_id, *, n
         folder=folder or os.path.dirname(file_path),
         file=file_path,
     )
-    media = MediaFileUpload(file_path, mimetype=mime_type)
     print(f"Uploading file to Drive: {file_path} parent={parent_folder_id}")
-    file = drive_service.files().create(
-        body=file_metadata,
-        media_body=media,
+    controller = get_drive_upload_controller()
+    max_retries = config.get_int_credential("DRIVE_UPLOAD_MAX_RETRIES", 5, minimum=0)
+    file_size = os.path.getsize(file_path)
+    attempt = 0
+    while True:
+        if not controller.acquire():
+            print(f"Cancellation requested; not uploading {file_path}.")
+            return None
+        started = time.monotonic()
+        try:
+            file_id = _upload_to_parent_once(
+                drive_service, file_path, file_metadata, mime_type, resolve_parent, controller.record_throttle
+            )
+        except Exception as exc:
+            if not is_transient_drive_error(exc) or attempt >= max_retries:
+                raise
+            if is_drive_throttle_error(exc):
+                controller.record_throttle()
+            attempt += 1
+            metrics.record_retry(_drive_host(drive_service), _drive_error_reason(exc))
+            delay = min(2 ** attempt, 60) + random.uniform(0, 1)
+            print(f"Drive rejected {file_path} ({exc}); retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+        else:
+            if file_id:
+                controller.record_success(time.monotonic() - started, file_size)
+                metrics.record_upload(_drive_host(drive_service), file_size)
+            return file_id
+        finally:
+            controller.release()
+        time.sleep(delay)
+
+
+def _resource_relative_path(file_path):
+    try:
+        relative_path = os.path.relpath(file_path, os.path.abspath(get_resource_root()))
+    except ValueError:
+        relative_path = file_path
+    return Path(relative_path).as_posix()
+
+
+def record_drive_upload(sheet_id, file_path, file_id):
+    """Remember the Drive file ID produced for a local file so later stages (and a resumed job) can reuse it."""
+    if file_id:
+        get_sheet_state(sheet_id).setdefault("drive_files", {})[os.path.abspath(file_path)] = file_id
+        job_store.record_drive_file(
+            config.get_credential("JOB_ID"), sheet_id, _resource_relative_path(file_path), file_id
+        )
+
+
+def get_recorded_drive_files(sheet_id):
+    """Drive file IDs uploaded for a sheet in this job, keyed by path relative to the resource root."""
+    return {
+        _resource_relative_path(file_path): file_id
+        for file_path, file_id in get_sheet_state(sheet_id).get("drive_files", {}).items()
+    }
+
+
+def restore_sheet_checkpoint(sheet_id, checkpoint):
+    """
+    Seed a sheet's working state from the checkpoint an interrupted run of this job left behind:
+    uploads already in Drive are reused (the archive copies them server-side) and attachments
+    already synced are not transferred again.
+    """
+    state = get_sheet_state(sheet_id)
+    resource_root = get_resource_root()
+    drive_files = state.setdefault("drive_files", {})
+    for relative_path, file_id in checkpoint["drive_files"].items():
+        drive_files[os.path.abspath(os.path.join(resource_root, relative_path))] = file_id
+    if checkpoint["attachments"]:
+        previous_attachment_records(sheet_id).update(checkpoint["attachments"])
+        state["resumed_attachment_ids"] = set(checkpoint["attachments"])
+
+
+def copy_drive_file(drive_service, source_file_id, file_name, parent_folder_id):
+    """Server-side copy of an existing Drive file into another folder; no file bytes leave this host."""
+    max_retries = config.get_int_credential("DRIVE_UPLOAD_MAX_RETRIES", 5, minimum=0)
+    copied = drive_service.files().copy(
+        fileId=source_file_id,
+        body={"name": file_name, "parents": [parent_folder_id]},
         fields="id",
         supportsAllDrives=True,
-    ).execute()
-    return file.get("id")
+    ).execute(num_retries=max_retries)
+    return copied.get("id")
 
 
-def upload_folder_tree_to_drive(local_folder, drive_folder_id, *, note_prefix, folder_cache=None):
-    """Upload a local folder tree to Drive, preserving folders below the given root."""
+def upload_folder_tree_to_drive(local_folder, drive_folder_id, *, note_prefix, folder_cache=None, copy_sources=None):
+    """
+    Upload a local folder tree to Drive, preserving folders below the given root.
+    Files listed in `copy_sources` (absolute local path → Drive file ID) are copied server-side
+    from that Drive file instead; the local upload is only the fallback when the copy fails.
+    """
     folder_cache = folder_cache if folder_cache is not None else {}
+    copy_sources = copy_sources or {}
     drive_service, _, _ = get_google_services()
     uploaded_file_ids = []
 
@@ -729,7 +1702,20 @@ def upload_folder_tree_to_drive(local_folder, drive_folder_id, *, note_prefix, f
         )
 
         for file_name in file_names:
+            if process_state.is_cancel_requested():
+                return uploaded_file_ids
             file_path = os.path.join(current_root, file_name)
+            source_file_id = copy_sources.get(os.path.abspath(file_path))
+            if source_file_id:
+                report_current_work(note=f"{note_prefix} (Drive copy)", folder=current_root, file=file_path)
+                try:
+                    uploaded_file_ids.append(
+                        copy_drive_file(drive_service, source_file_id, file_name, current_parent_id)
+                    )
+                    print(f"Copied Drive file {source_file_id} for {file_path} into {current_parent_id}")
+                    continue
+                except HttpError as e:
+                    print(f"Drive copy of {source_file_id} failed ({e}); uploading {file_path} instead.")
             uploaded_file_ids.append(
                 upload_file_to_drive_parent(
                     drive_service,
@@ -747,6 +1733,7 @@ def upload_archive_copy_to_drive(sheet_id):
     """
     Upload a duplicate archive copy into:
     <archive-root>/resource/<api-suffix>/{sheets,comments,rowmapping,attachment}/...
+    Files the primary upload stages already put in Drive are copied with files.copy.
     """
     try:
         archive_root_id = get_archive_drive_root_folder_id()
@@ -769,6 +1756,8 @@ def upload_archive_copy_to_drive(sheet_id):
             ("attachment", attachments_folder_path(sheet_id, create=False), "Uploading archive attachment"),
         ]
         uploaded_files = {}
+        # Files already uploaded by the primary stages are copied server-side.
+        copy_sources = get_sheet_state(sheet_id).get("drive_files", {})
 
         for section_name, local_folder, note_prefix in archive_sections:
             if not os.path.isdir(local_folder):
@@ -785,8 +1774,28 @@ def upload_archive_copy_to_drive(sheet_id):
                 section_folder_id,
                 note_prefix=note_prefix,
                 folder_cache=folder_cache,
+                copy_sources=copy_sources,
             )
 
+        # Streamed attachments never touched local disk; copy them from the primary Drive files.
+        streamed_attachments = get_sheet_state(sheet_id).get("streamed_attachments", [])
+        if streamed_attachments:
+            drive_service, _, _ = get_google_services()
+            copied_ids = uploaded_files.setdefault("attachment", [])
+            for row_folder, file_name, source_file_id in streamed_attachments:
+                if process_state.is_cancel_requested():
+                    break
+                parent_id = ensure_drive_folder_path(
+                    ["attachment", str(sheet_id), row_folder],
+                    archive_user_root_id,
+                    folder_cache,
+                )
+                try:
+                    copied_ids.append(copy_drive_file(drive_service, source_file_id, file_name, parent_id))
+                except HttpError as e:
+                    print(f"Drive copy of streamed attachment {file_name} ({source_file_id}) failed: {e}")
+                    mark_stage_failed(sheet_id, "upload_archive", e)
+
         return uploaded_files
 
     except HttpError as e:
@@ -795,9 +1804,11 @@ def upload_archive_copy_to_drive(sheet_id):
             print(f"Drive error details: {e.error_details}")
         except Exception:
             pass
+        mark_stage_failed(sheet_id, "upload_archive", e)
         return None
     except Exception as e:
         print(f"Error uploading duplicate archive for sheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "upload_archive", e)
         return None
 
 
@@ -823,6 +1834,8 @@ def cleanup_sheet_temp_data(sheet_id):
         Path(attachments_folder_path(sheet_id, create=False)),
     ]
     removed_folders = []
+    clear_sheet_state(sheet_id)
+    disk_budget.release_sheet(config.get_credential("JOB_ID"), sheet_id)
 
     for folder in temp_folders:
         if not folder.exists():
@@ -846,14 +1859,12 @@ def upload_to_google_drive(sheet_id):
     """Uploads an Excel file to Google Drive in sheets/{sheet_id} folder."""
     try:
         drive_service, _, _ = get_google_services()
-        # Find the downloaded Excel file using wildcard
         sheet_folder = sheet_folder_path(sheet_id)
-        excel_files = glob.glob(os.path.join(sheet_folder, "*.xlsx"))
-        if not excel_files:
+        file_path = sheet_export_path(sheet_id)
+        if not os.path.exists(file_path):
             print(f"Smartsheet Excel not found in {sheet_folder}")
             return None
 
-        file_path = excel_files[0]  # Select first found file
         GOOGLE_DRIVE_SHEETS_FOLDER_ID = config.get_credential("GOOGLE_DRIVE_SHEETS_FOLDER_ID")
         # Ensure `sheets/{sheet_id}` folder exists in Google Drive
         print(f"Using Sheets parent folder ID: {GOOGLE_DRIVE_SHEETS_FOLDER_ID}")
@@ -864,27 +1875,21 @@ def upload_to_google_drive(sheet_id):
             return None
 
         # Upload the file to `sheets/{sheet_id}` folder in Drive
-        file_metadata = {
-            "name": os.path.basename(file_path),
-            "mimeType": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "parents": [drive_sheet_folder_id],
-        }
-        report_current_work(
+        file_id = upload_file_to_drive_parent(
+            drive_service,
+            file_path,
+            drive_sheet_folder_id,
             note="Uploading sheet to Drive",
             folder=sheet_folder,
-            file=file_path,
+            mime_type=XLSX_MIME_TYPE,
+            resolve_parent=lambda: get_or_create_drive_folder(str(sheet_id), GOOGLE_DRIVE_SHEETS_FOLDER_ID),
         )
-        media = MediaFileUpload(file_path, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        print(f"Uploading sheet to Drive: {file_path} parent={drive_sheet_folder_id}")
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id",
-            supportsAllDrives=True,
-        ).execute()
+        if not file_id:
+            return None
 
+        record_drive_upload(sheet_id, file_path, file_id)
         print(f"Uploaded {file_path} to Google Drive folder: sheets/{sheet_id} (parent {drive_sheet_folder_id})")
-        return file.get("id")
+        return file_id
 
     except HttpError as e:
         print(f"Drive upload failed for {file_path}: {e}")
@@ -897,8 +1902,332 @@ def upload_to_google_drive(sheet_id):
         print(f"Error uploading {file_path} to Google Drive: {e}")
         return None
     
+def _submit_with_context(executor, fn, *args, **kwargs):
+    """Submit work to a pool so it sees the caller's job credentials and current job."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _bump_stat(stats, stats_lock, key, amount=1):
+    with stats_lock:
+        stats[key] += amount
+
+
+def previous_attachment_records(sheet_id):
+    """
+    Attachments synced to Drive by the last successful backup of this sheet, keyed by attachment ID.
+    Empty when INCREMENTAL_BACKUP is off or the Drive destination changed since then.
+    """
+    state = get_sheet_state(sheet_id)
+    if "previous_attachments" not in state:
+        records = {}
+        if config.get_bool_credential("INCREMENTAL_BACKUP", True):
+            entry = sheet_manifest.get_sheet_entry(get_storage_user_suffix(), sheet_id)
+            if entry and entry.get("destination") == get_backup_destination():
+                records = entry.get("attachments") or {}
+        state["previous_attachments"] = records
+    return state["previous_attachments"]
+
+
+def _attachment_record(attachment, row_id):
+    return {
+        "attachment_id": str(getattr(attachment, "id", "")),
+        "name": getattr(attachment, "name", None),
+        "size_in_kb": getattr(attachment, "size_in_kb", None),
+        "row_id": str(row_id),
+    }
+
+
+def attachment_file_names(attachments):
+    """
+    Map each attachment ID on a row to the local file name it is saved under.
+    Attachments whose sanitized names collide get their attachment ID appended, so parallel
+    downloads never share a path and every file keeps its own manifest record.
+    """
+    names = {}
+    taken = set()
+    for attachment in attachments:
+        att_id = getattr(attachment, "id", None)
+        file_name = sanitize_filename(getattr(attachment, "name", None) or f"attachment_{att_id}")
+        if file_name.lower() in taken:
+            base, ext = os.path.splitext(file_name)
+            file_name = f"{base}_{att_id}{ext}"
+        taken.add(file_name.lower())
+        names[str(att_id)] = file_name
+    return names
+
+
+def _is_attachment_unchanged(previous, current):
+    return bool(
+        previous
+        and previous.get("drive_file_id")
+        and current["size_in_kb"] is not None
+        and previous.get("size_in_kb") == current["size_in_kb"]
+        and previous.get("name") == current["name"]
+        and previous.get("row_id") == current["row_id"]
+    )
+
+
+def record_attachment_upload(sheet_id, file_path, file_id):
+    """Mark the attachment downloaded to `file_path` as synced to the given Drive file."""
+    state = get_sheet_state(sheet_id)
+    record = state.get("attachment_files", {}).get(os.path.abspath(file_path))
+    if record and file_id:
+        synced = dict(record, drive_file_id=file_id)
+        state.setdefault("synced_attachments", {})[record["attachment_id"]] = synced
+        job_store.record_attachment(config.get_credential("JOB_ID"), sheet_id, synced)
+
+
+def get_attachment_sync_result(sheet_id):
+    """
+    Return (synced, complete): the attachment records to persist in the manifest and whether every
+    attachment seen this run reached Drive (incomplete sheets are fully re-checked next run).
+    """
+    state = get_sheet_state(sheet_id)
+    synced = state.get("synced_attachments", {})
+    seen = state.get("seen_attachments", set())
+    return dict(synced), seen.issubset(synced)
+
+
+def _stream_attachment_file(sheet_id, row_id, file_path, attachment, response, drive_folder_id, stats, stats_lock):
+    """Pass-through transfer: send an open download response straight to Drive. Returns True when stored."""
+    file_name = os.path.basename(file_path)
+    mime_type = getattr(attachment, "mime_type", None) or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    controller = get_drive_upload_controller()
+    if not controller.acquire():
+        return False
+    started = time.monotonic()
+    try:
+        file_id, bytes_sent = stream_response_to_drive(
+            response, file_name, mime_type, drive_folder_id, controller.record_throttle
+        )
+    except Exception as stream_err:
+        if is_drive_throttle_error(stream_err):
+            controller.record_throttle()
+        _bump_stat(stats, stats_lock, "attachments_failed")
+        print(f"Failed streaming {file_name} (row {row_id}) to Drive: {stream_err}")
+        return False
+    finally:
+        controller.release()
+    if not file_id:
+        return False
+
+    controller.record_success(time.monotonic() - started, bytes_sent)
+    metrics.record_download(metrics.url_host(response.url), bytes_sent)
+    metrics.record_upload(_drive_host(get_google_services()[0]), bytes_sent)
+    # The local path is never written; it keys the manifest records exactly as a disk transfer would.
+    record_drive_upload(sheet_id, file_path, file_id)
+    state = get_sheet_state(sheet_id)
+    synced = dict(_attachment_record(attachment, row_id), drive_file_id=file_id)
+    state.setdefault("synced_attachments", {})[synced["attachment_id"]] = synced
+    job_store.record_attachment(config.get_credential("JOB_ID"), sheet_id, synced)
+    state.setdefault("streamed_attachments", []).append((str(row_id), file_name, file_id))
+    print(f"Streamed {file_name} (row {row_id}) to Drive folder {drive_folder_id}")
+    _bump_stat(stats, stats_lock, "attachments_saved")
+    return True
+
+
+def attachment_drive_row_folder(sheet_id, row_id):
+    """Drive folder for a row's attachments (Attachments/{sheet_id}/{row_id}), created if missing."""
+    drive_sheet_folder_id = get_or_create_drive_folder(
+        f"{sheet_id}", config.get_credential("GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID")
+    )
+    if not drive_sheet_folder_id:
+        return None
+    return get_or_create_drive_folder(str(row_id), drive_sheet_folder_id)
+
+
+def _reserve_attachment_space(sheet_id, response, attachment):
+    """
+    Reserve tempData space for an attachment before it is written, sized from Content-Length
+    (or the attachment's size_in_kb, or a conservative default when neither is known).
+    Returns the reserved bytes, or None when the disk budget
+    is exhausted: TEMP_DISK_FULL_POLICY=pause first waits, up to TEMP_DISK_PAUSE_TIMEOUT_SECONDS,
+    for sheets past their download stage to free space.
+    """
+    try:
+        estimate = int(response.headers.get("Content-Length") or 0)
+    except (TypeError, ValueError):
+        estimate = 0
+    if not estimate:
+        estimate = int((getattr(attachment, "size_in_kb", None) or 0) * 1024)
+    estimate = disk_budget.reservation_size(estimate)
+    policy = (config.get_credential("TEMP_DISK_FULL_POLICY") or "pause").strip().lower()
+    if disk_budget.reserve(
+        config.get_credential("JOB_ID"), sheet_id, estimate, get_base_dir(), wait=policy == "pause"
+    ):
+        return estimate
+    return None
+
+
+def _download_attachment_file(
+    smartsheet_client, sheet_id, row_id, row_folder, attachment, file_name, stats, stats_lock, drive_folder_id=None
+):
+    """
+    Download one row attachment into its row folder as `file_name`. Returns True when the file was saved.
+    With a `drive_folder_id` (ATTACHMENT_TRANSFER_MODE=stream) the download is piped to Drive instead,
+    as it also is when the tempData disk budget has no room left for the file.
+    """
+    if process_state.is_cancel_requested():
+        return False
+
+    att_id = getattr(attachment, "id", None)
+    file_path = os.path.join(row_folder, file_name)
+
+    # Fetch attachment details
+    try:
+        retrieve_att = smartsheet_client.Attachments.get_attachment(sheet_id, att_id)
+    except Exception as get_err:
+        _bump_stat(stats, stats_lock, "attachments_failed")
+        print(f"Skipped {file_name} (row {row_id}): get_attachment failed ({get_err})")
+        return False
+
+    file_url = getattr(retrieve_att, "url", None)
+    if not file_url:
+        _bump_stat(stats, stats_lock, "attachments_failed")
+        print(
+            f"Skipped {file_name} (row {row_id}): no download URL "
+            f"(response={type(retrieve_att).__name__}, "
+            f"message={getattr(retrieve_att, 'message', None)}, "
+            f"error_code={getattr(retrieve_att, 'error_code', None)})"
+        )
+        return False
+
+    report_current_work(
+        note="Streaming attachment to Drive" if drive_folder_id else "Downloading attachment",
+        folder=row_folder,
+        file=file_name,
+    )
+    # Smartsheet returns a pre-signed URL; adding Authorization breaks S3 downloads
+    try:
+        response = get_attachment_http_session().get(file_url, stream=True, allow_redirects=True, timeout=60)
+    except requests.RequestException as req_err:
+        _bump_stat(stats, stats_lock, "attachments_failed")
+        print(f"Skipped {file_name} (row {row_id}): request failed ({req_err})")
+        return False
+
+    try:
+        if response.status_code != 200:
+            _bump_stat(stats, stats_lock, "attachments_failed")
+            body_preview = ""
+            try:
+                body_preview = response.text[:200]
+            except Exception:
+                pass
+            print(
+                f"Skipped {file_name} (row {row_id}): download returned "
+                f"{response.status_code} ({body_preview})"
+            )
+            return False
+
+        if not drive_folder_id:
+            reserved = _reserve_attachment_space(sheet_id, response, attachment)
+            if reserved is None:
+                if process_state.is_cancel_requested():
+                    return False
+                print(f"tempData disk budget reached; streaming {file_name} (row {row_id}) straight to Drive")
+                drive_folder_id = attachment_drive_row_folder(sheet_id, row_id)
+                if not drive_folder_id:
+                    _bump_stat(stats, stats_lock, "attachments_failed")
+                    print(f"Skipped {file_name} (row {row_id}): no disk budget and no Drive folder to stream to")
+                    return False
+
+        if drive_folder_id:
+            return _stream_attachment_file(
+                sheet_id, row_id, file_path, attachment, response, drive_folder_id, stats, stats_lock
+            )
+
+        job_id = config.get_credential("JOB_ID")
+        os.makedirs(row_folder, exist_ok=True)  # Create folder for row only when saving a file
+        try:
+            with open(file_path, "wb") as file:
+                for chunk in response.iter_content(chunk_size=8192):
+                    # Check for cancellation during file download
+                    if process_state.is_cancel_requested():
+                        print(f"Cancellation requested during download of {file_path}; stopping file download.")
+                        break
+                    if chunk:
+                        file.write(chunk)
+        except Exception as write_err:
+            _bump_stat(stats, stats_lock, "attachments_failed")
+            print(f"Failed writing {file_path}: {write_err}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            disk_budget.settle(job_id, sheet_id, reserved, 0)
+            return False
+    finally:
+        response.close()
+
+    if process_state.is_cancel_requested():
+        # Drop the partial file so it is never uploaded.
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        disk_budget.settle(job_id, sheet_id, reserved, 0)
+        return False
+
+    # Settle the reservation to the size actually written.
+    disk_budget.settle(job_id, sheet_id, reserved, os.path.getsize(file_path))
+
+    print(f"Downloaded: {file_path}")
+    metrics.record_download(metrics.url_host(file_url), os.path.getsize(file_path))
+    get_sheet_state(sheet_id).setdefault("attachment_files", {})[os.path.abspath(file_path)] = _attachment_record(
+        attachment, row_id
+    )
+    _bump_stat(stats, stats_lock, "attachments_saved")
+    return True
+
+
+def _iter_attachment_rows(smartsheet_client, sheet_id, stats, stats_lock):
+    """
+    Yield (row_id, attachments) pairs for a sheet.
+    The default "sheet" discovery mode lists attachments in bulk so rows without files cost nothing;
+    "row" mode (and the fallback when bulk listing fails) calls list_row_attachments only for rows
+    the row snapshot flags as having attachments or discussions (which may carry attachments).
+    """
+    _bump_stat(stats, stats_lock, "rows_seen", len(get_sheet_row_snapshot(sheet_id, smartsheet_client)))
+    discovery_mode = (config.get_credential("ATTACHMENT_DISCOVERY_MODE") or "sheet").strip().lower()
+    if discovery_mode == "sheet":
+        try:
+            attachments_by_row = discover_sheet_attachments(smartsheet_client, sheet_id)
+        except Exception as list_err:
+            print(f"Bulk attachment listing failed for sheet {sheet_id} ({list_err}); falling back to per-row listing.")
+        else:
+            print(f"Found attachments on {len(attachments_by_row)} row(s) of sheet {sheet_id}")
+            for row_id, attachments in attachments_by_row.items():
+                yield row_id, attachments
+            return
+
+    for row in get_sheet_row_snapshot(sheet_id, smartsheet_client):
+        if not row.has_attachments:
+            continue
+        row_id = row.row_id  # Unique Row ID in Smartsheet
+
+        # Some API failures return an Error model (without `data`) instead of raising.
+        try:
+            row_attachments_result = smartsheet_client.Attachments.list_row_attachments(sheet_id, row_id)
+        except Exception as list_err:
+            _bump_stat(stats, stats_lock, "rows_failed")
+            print(f"Skipped row {row_id}: failed to list attachments ({list_err})")
+            continue
+
+        attachments = getattr(row_attachments_result, "data", None)
+        if attachments is None:
+            _bump_stat(stats, stats_lock, "rows_failed")
+            print(
+                f"Skipped row {row_id}: list_row_attachments returned "
+                f"{type(row_attachments_result).__name__} "
+                f"(message={getattr(row_attachments_result, 'message', None)}, "
+                f"error_code={getattr(row_attachments_result, 'error_code', None)})"
+            )
+            continue
+
+        yield row_id, attachments
+
+
 def download_smartsheet_attachments(sheet_id):
-    """Downloads all attachments from a Smartsheet and saves them in resource/attachments/{sheet_id}/{row_id}/."""
+    """
+    Downloads attachments from a Smartsheet and saves them in resource/attachments/{sheet_id}/{row_id}/.
+    Attachments whose ID, name and size match the last successful sync are not downloaded again.
+    """
     smartsheet_client = get_smartsheet_client()
     stats = {
         "rows_seen": 0,
@@ -907,130 +2236,108 @@ def download_smartsheet_attachments(sheet_id):
         "rows_with_saved_files": 0,
         "attachments_seen": 0,
         "attachments_saved": 0,
+        "attachments_unchanged": 0,
         "attachments_failed": 0,
     }
+    stats_lock = threading.Lock()
+    worker_count = config.get_int_credential("ATTACHMENT_DOWNLOAD_WORKERS", 4, minimum=1)
+    max_pending = worker_count * 2
+    executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix=f"attachments-{sheet_id}")
+    pending = set()
+    row_futures = {}
+    previous_records = previous_attachment_records(sheet_id)
+    sheet_state = get_sheet_state(sheet_id)
+    seen_attachments = sheet_state.setdefault("seen_attachments", set())
+    synced_attachments = sheet_state.setdefault("synced_attachments", {})
+    resumed_attachment_ids = sheet_state.get("resumed_attachment_ids", set())
+    stream_to_drive = (config.get_credential("ATTACHMENT_TRANSFER_MODE") or "disk").strip().lower() == "stream"
+    # Stream mode holds transfers back until all their row folders are resolved in one batch.
+    stream_transfers = []
+
+    def submit_download(row_id, row_folder, attachment, file_name, drive_row_folder_id=None):
+        nonlocal pending
+        future = _submit_with_context(
+            executor,
+            _download_attachment_worker,
+            smartsheet_client,
+            sheet_id,
+            row_id,
+            row_folder,
+            attachment,
+            file_name,
+            stats,
+            stats_lock,
+            drive_row_folder_id,
+        )
+        row_futures.setdefault(row_id, []).append(future)
+        pending.add(future)
+        # Bound the queue so discovery never runs far ahead of the downloads.
+        if len(pending) >= max_pending:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
 
     try:
-        print(f"Starting download of attachments for sheet {sheet_id}")
+        print(f"Starting download of attachments for sheet {sheet_id} with {worker_count} worker(s)")
         # Create base folder for the sheet's attachments
         base_folder = attachments_folder_path(sheet_id, create=False)
 
-        for row in iter_sheet_rows(smartsheet_client, sheet_id):
+        for row_id, attachments in _iter_attachment_rows(smartsheet_client, sheet_id, stats, stats_lock):
             # Check for cancellation before processing a new row
             if process_state.is_cancel_requested():
                 print("Cancellation requested before processing row; stopping attachments download.")
+                executor.shutdown(wait=True, cancel_futures=True)
                 return stats
 
-            stats["rows_seen"] += 1
-            row_id = row.id  # Unique Row ID in Smartsheet
             row_folder = os.path.join(base_folder, str(row_id))
-
-            # Some API failures return an Error model (without `data`) instead of raising.
-            try:
-                row_attachments_result = smartsheet_client.Attachments.list_row_attachments(sheet_id, row_id)
-            except Exception as list_err:
-                stats["rows_failed"] += 1
-                print(f"Skipped row {row_id}: failed to list attachments ({list_err})")
-                continue
-
-            attachments = getattr(row_attachments_result, "data", None)
-            if attachments is None:
-                stats["rows_failed"] += 1
-                print(
-                    f"Skipped row {row_id}: list_row_attachments returned "
-                    f"{type(row_attachments_result).__name__} "
-                    f"(message={getattr(row_attachments_result, 'message', None)}, "
-                    f"error_code={getattr(row_attachments_result, 'error_code', None)})"
-                )
-                continue
-
             if not attachments:
                 continue
 
-            stats["rows_with_attachments"] += 1
-            row_folder_created = False
-            row_saved_any = False
-
+            _bump_stat(stats, stats_lock, "rows_with_attachments")
+            file_names = attachment_file_names(attachments)
             for attachment in attachments:
-                # Check for cancellation before processing each attachment
-                if process_state.is_cancel_requested():
-                    print(f"Cancellation requested; stopping download for row {row_id}.")
-                    return stats
-
-                stats["attachments_seen"] += 1
-                att_id = getattr(attachment, "id", None)
-                raw_name = getattr(attachment, "name", None) or f"attachment_{att_id}"
-                file_name = sanitize_filename(raw_name)  # Clean the filename
-                file_path = os.path.join(row_folder, file_name)
-
-                # Fetch attachment details
-                try:
-                    retrieve_att = smartsheet_client.Attachments.get_attachment(sheet_id, att_id)
-                except Exception as get_err:
-                    stats["attachments_failed"] += 1
-                    print(f"Skipped {file_name} (row {row_id}): get_attachment failed ({get_err})")
-                    continue
-
-                file_url = getattr(retrieve_att, "url", None)
-                if not file_url:
-                    stats["attachments_failed"] += 1
-                    print(
-                        f"Skipped {file_name} (row {row_id}): no download URL "
-                        f"(response={type(retrieve_att).__name__}, "
-                        f"message={getattr(retrieve_att, 'message', None)}, "
-                        f"error_code={getattr(retrieve_att, 'error_code', None)})"
-                    )
-                    continue
-
-                report_current_work(
-                    note="Downloading attachment",
-                    folder=row_folder,
-                    file=file_name,
-                )
-                # Smartsheet returns a pre-signed URL; adding Authorization breaks S3 downloads
-                try:
-                    response = requests.get(file_url, stream=True, allow_redirects=True, timeout=60)
-                except requests.RequestException as req_err:
-                    stats["attachments_failed"] += 1
-                    print(f"Skipped {file_name} (row {row_id}): request failed ({req_err})")
-                    continue
-
-                if response.status_code != 200:
-                    stats["attachments_failed"] += 1
-                    body_preview = ""
-                    try:
-                        body_preview = response.text[:200]
-                    except Exception:
-                        pass
-                    print(
-                        f"Skipped {file_name} (row {row_id}): download returned "
-                        f"{response.status_code} ({body_preview})"
-                    )
-                    continue
-
-                if not row_folder_created:
-                    os.makedirs(row_folder, exist_ok=True)  # Create folder for row only when saving a file
-                    row_folder_created = True
-
-                try:
-                    with open(file_path, "wb") as file:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            # Check for cancellation during file download
-                            if process_state.is_cancel_requested():
-                                print(f"Cancellation requested during download of {file_path}; stopping file download.")
-                                return stats
-                            if chunk:
-                                file.write(chunk)
-                except Exception as write_err:
-                    stats["attachments_failed"] += 1
-                    print(f"Failed writing {file_path}: {write_err}")
+                _bump_stat(stats, stats_lock, "attachments_seen")
+                current = _attachment_record(attachment, row_id)
+                seen_attachments.add(current["attachment_id"])
+                previous = previous_records.get(current["attachment_id"])
+                if _is_attachment_unchanged(previous, current):
+                    synced_attachments[current["attachment_id"]] = previous
+                    if current["attachment_id"] in resumed_attachment_ids:
+                        # Uploaded before the job was interrupted: the archive copies it like a streamed file.
+                        sheet_state.setdefault("streamed_attachments", []).append(
+                            (
+                                current["row_id"],
+                                file_names[current["attachment_id"]],
+                                previous["drive_file_id"],
+                            )
+                        )
+                    _bump_stat(stats, stats_lock, "attachments_unchanged")
                     continue
+                if stream_to_drive:
+                    stream_transfers.append((row_id, row_folder, attachment, file_names[current["attachment_id"]]))
+                else:
+                    submit_download(row_id, row_folder, attachment, file_names[current["attachment_id"]])
+
+        if stream_transfers and not process_state.is_cancel_requested():
+            drive_sheet_folder_id = get_or_create_drive_folder(
+                f"{sheet_id}", config.get_credential("GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID")
+            )
+            drive_row_folder_ids = (
+                resolve_drive_folders([row_id for row_id, *_ in stream_transfers], drive_sheet_folder_id)
+                if drive_sheet_folder_id
+                else {}
+            )
+            for row_id, row_folder, attachment, file_name in stream_transfers:
+                if process_state.is_cancel_requested():
+                    break
+                # A row whose folder could not be resolved is saved to disk for the upload stage instead.
+                submit_download(row_id, row_folder, attachment, file_name, drive_row_folder_ids.get(str(row_id)))
 
-                print(f"Downloaded: {file_path}")
-                stats["attachments_saved"] += 1
-                row_saved_any = True
+        wait(pending)
+        if process_state.is_cancel_requested():
+            print(f"Cancellation requested; stopped attachment downloads for sheet {sheet_id}.")
+            return stats
 
-            if row_saved_any:
+        for futures in row_futures.values():
+            if any(future.result() for future in futures):
                 stats["rows_with_saved_files"] += 1
 
         if stats["attachments_saved"] == 0:
@@ -1043,13 +2350,18 @@ def download_smartsheet_attachments(sheet_id):
             f"rows_with_saved_files={stats['rows_with_saved_files']} "
             f"attachments_seen={stats['attachments_seen']} "
             f"attachments_saved={stats['attachments_saved']} "
+            f"attachments_unchanged={stats['attachments_unchanged']} "
             f"attachments_failed={stats['attachments_failed']}"
         )
         return stats
 
     except Exception as e:
         print(f"Error downloading attachments for sheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "attachments", e)
         return stats
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        disk_budget.finish_downloads(config.get_credential("JOB_ID"), sheet_id)
 
 
 def upload_comments_to_drive(sheet_id):
@@ -1073,27 +2385,21 @@ def upload_comments_to_drive(sheet_id):
         drive_folder_id = get_or_create_drive_folder(f"{sheet_id}", GOOGLE_DRIVE__COMMENTS_FOLDER_ID)
 
         # ? Upload the file to Google Drive
-        file_metadata = {
-            "name": os.path.basename(file_path),
-            "mimeType": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "parents": [drive_folder_id],
-        }
-        report_current_work(
+        file_id = upload_file_to_drive_parent(
+            drive_service,
+            file_path,
+            drive_folder_id,
             note="Uploading comments to Drive",
             folder=comments_folder,
-            file=file_path,
+            mime_type=XLSX_MIME_TYPE,
+            resolve_parent=lambda: get_or_create_drive_folder(f"{sheet_id}", GOOGLE_DRIVE__COMMENTS_FOLDER_ID),
         )
-        media = MediaFileUpload(file_path, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        print(f"Uploading comments to Drive: {file_path} parent={drive_folder_id}")
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id",
-            supportsAllDrives=True,
-        ).execute()
+        if not file_id:
+            return None
 
+        record_drive_upload(sheet_id, file_path, file_id)
         print(f"Uploaded {file_path} to Google Drive in comments/{sheet_id}/ (parent {drive_folder_id})")
-        return file.get("id")
+        return file_id
 
     except HttpError as e:
         print(f"Drive upload failed for comments {file_path}: {e}")
@@ -1101,16 +2407,37 @@ def upload_comments_to_drive(sheet_id):
             print(f"Drive error details: {e.error_details}")
         except Exception:
             pass
+        mark_stage_failed(sheet_id, "upload_comments", e)
         return None
     except Exception as e:
         print(f"Error uploading comments for sheet {sheet_id} to Google Drive: {e}")
+        mark_stage_failed(sheet_id, "upload_comments", e)
         return None
 
 
+def _upload_attachment_file(file_path, row_folder_path, drive_row_folder_id, resolve_parent):
+    """Upload worker: sends one attachment with this thread's own Drive client."""
+    with metrics.track_active("attachment_upload"):
+        return upload_file_to_drive_parent(
+            get_google_services()[0],
+            file_path,
+            drive_row_folder_id,
+            note="Uploading attachment to Drive",
+            folder=row_folder_path,
+            mime_type="application/octet-stream",
+            resolve_parent=resolve_parent,
+        )
+
+
+def _download_attachment_worker(*args):
+    """Download worker: one attachment, counted as an active transfer."""
+    with metrics.track_active("attachment_download"):
+        return _download_attachment_file(*args)
+
+
 def upload_attachments_to_drive(sheet_id):
     """Uploads all attachments in resource/attachments/{sheet_id}/{row_id}/ to Google Drive."""
     try:
-        drive_service, _, _ = get_google_services()
         GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID = config.get_credential("GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID")
         print(f"Using Attachments parent folder ID: {GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID}")
         # Define the base attachments directory
@@ -1124,46 +2451,71 @@ def upload_attachments_to_drive(sheet_id):
 
         uploaded_files = {}
 
-        # Loop through row_id folders
-        for row_folder in os.listdir(attachments_folder):
+        # Collect row_id folders that hold files (rows with no attachments get no Drive folder)
+        row_files = {}
+        for row_folder in sorted(os.listdir(attachments_folder)):
             row_folder_path = os.path.join(attachments_folder, row_folder)
             if not os.path.isdir(row_folder_path):
                 continue  # Skip non-folder files
-
-            # Find all files inside row_id folder
-            attachment_files = glob.glob(os.path.join(row_folder_path, "*.*"))
-            if not attachment_files:
-                # Skip creating Drive folders for rows with no attachments
+            # Every regular file, extensionless names ("README", "attachment_<id>") included
+            attachment_files = [
+                file_path
+                for file_path in (
+                    os.path.join(row_folder_path, file_name) for file_name in sorted(os.listdir(row_folder_path))
+                )
+                if os.path.isfile(file_path) and not file_path.endswith(".part")
+            ]
+            if attachment_files:
+                row_files[row_folder] = attachment_files
+
+        # Resolve every attachments/{sheet_id}/{row_id} folder before any bytes move
+        drive_row_folder_ids = resolve_drive_folders(row_files, drive_sheet_folder_id)
+
+        uploads = []
+        for row_folder, attachment_files in row_files.items():
+            drive_row_folder_id = drive_row_folder_ids.get(row_folder)
+            if not drive_row_folder_id:
+                print(f"No Drive folder for row {row_folder} of sheet {sheet_id}; skipping its attachments.")
                 continue
-
-            # Ensure Drive folder exists for attachments/{sheet_id}/{row_id}
-            drive_row_folder_id = get_or_create_drive_folder(row_folder, drive_sheet_folder_id)
-            for file_path in attachment_files:
-                file_name = os.path.basename(file_path)
-
-                # Upload the file to Google Drive
-                file_metadata = {
-                    "name": file_name,
-                    "mimeType": "application/octet-stream",
-                    "parents": [drive_row_folder_id],
-                }
-                report_current_work(
-                    note="Uploading attachment to Drive",
-                    folder=row_folder_path,
-                    file=file_name,
+            uploads.extend((row_folder, drive_row_folder_id, file_path) for file_path in attachment_files)
+        if not uploads:
+            return uploaded_files
+
+        # Files upload in parallel; the adaptive controller decides how many are actually in flight.
+        worker_count = min(config.get_int_credential("DRIVE_UPLOAD_MAX_CONCURRENCY", 16, minimum=1), len(uploads))
+        with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix=f"drive-{sheet_id}") as executor:
+            futures = [
+                (
+                    row_folder,
+                    drive_row_folder_id,
+                    file_path,
+                    _submit_with_context(
+                        executor,
+                        _upload_attachment_file,
+                        file_path,
+                        os.path.join(attachments_folder, row_folder),
+                        drive_row_folder_id,
+                        lambda row_folder=row_folder: get_or_create_drive_folder(row_folder, drive_sheet_folder_id),
+                    ),
                 )
-                media = MediaFileUpload(file_path, mimetype="application/octet-stream")
-                print(f"Uploading attachment to Drive: {file_path} parent={drive_row_folder_id}")
-                file = drive_service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields="id",
-                    supportsAllDrives=True,
-                ).execute()
-                drive_link = f"https://drive.google.com/file/d/{file.get('id')}/view"
+                for row_folder, drive_row_folder_id, file_path in uploads
+            ]
+            for row_folder, drive_row_folder_id, file_path, future in futures:
+                file_name = os.path.basename(file_path)
+                try:
+                    file_id = future.result()
+                except Exception as e:
+                    print(f"Failed to upload {file_path} to Drive: {e}")
+                    continue
+                if not file_id:
+                    print(f"Stopped uploading attachments for sheet {sheet_id}.")
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    return uploaded_files
+                record_drive_upload(sheet_id, file_path, file_id)
+                record_attachment_upload(sheet_id, file_path, file_id)
 
                 # Store uploaded file info
-                uploaded_files[file_name] = drive_link
+                uploaded_files[file_name] = f"https://drive.google.com/file/d/{file_id}/view"
 
                 print(f"Uploaded {file_name} to Google Drive in attachments/{sheet_id}/{row_folder}/ (parent {drive_row_folder_id})")
 
@@ -1175,9 +2527,11 @@ def upload_attachments_to_drive(sheet_id):
             print(f"Drive error details: {e.error_details}")
         except Exception:
             pass
+        mark_stage_failed(sheet_id, "upload_attachments", e)
         return None
     except Exception as e:
         print(f"Error uploading attachments for sheet {sheet_id}: {e}")
+        mark_stage_failed(sheet_id, "upload_attachments", e)
         return None
 
 
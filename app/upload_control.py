@@ -0,0 +1,98 @@
+import threading
+import time
+
+import process_state
+
+MIN_SAMPLE_BYTES = 256 * 1024
+LATENCY_TOLERANCE = 2.0
+DECREASE_FACTOR = 0.5
+EWMA_WEIGHT = 0.2
+
+_CONTROLLERS_LOCK = threading.Lock()
+_CONTROLLERS = {}
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the number of Drive uploads in flight for one quota (credential).
+    Each healthy completion adds 1/limit (about +1 per full window); a rate-limit or 5xx
+    response halves the limit, at most once per window so a burst of errors counts once.
+    Growth also stops while the smoothed seconds-per-MB runs above LATENCY_TOLERANCE times
+    the best seen, since that means Drive is already slowing down.
+    """
+
+    def __init__(self, *, start, minimum, maximum):
+        self._condition = threading.Condition()
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(start, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._latency_ewma = None
+        self._best_latency = None
+        self._duration_ewma = 1.0
+        self._last_decrease = 0.0
+
+    def configure(self, *, minimum, maximum):
+        with self._condition:
+            self.minimum = max(1, minimum)
+            self.maximum = max(self.minimum, maximum)
+            self.limit = min(max(self.limit, self.minimum), self.maximum)
+            self._condition.notify_all()
+
+    def acquire(self):
+        """Wait for an upload slot; returns False if the current job is cancelled meanwhile."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                if process_state.is_cancel_requested():
+                    return False
+                self._condition.wait(timeout=0.5)
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record_success(self, elapsed_seconds, size_bytes):
+        with self._condition:
+            self._duration_ewma += EWMA_WEIGHT * (elapsed_seconds - self._duration_ewma)
+            healthy = True
+            if size_bytes >= MIN_SAMPLE_BYTES:
+                seconds_per_mb = elapsed_seconds / (size_bytes / (1024 * 1024))
+                if self._latency_ewma is None:
+                    self._latency_ewma = seconds_per_mb
+                else:
+                    self._latency_ewma += EWMA_WEIGHT * (seconds_per_mb - self._latency_ewma)
+                if self._best_latency is None or self._latency_ewma < self._best_latency:
+                    self._best_latency = self._latency_ewma
+                healthy = self._latency_ewma <= self._best_latency * LATENCY_TOLERANCE
+            if healthy and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._condition.notify_all()
+
+    def record_throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            # One decrease per typical upload duration: uploads already in flight were sent at the old limit.
+            if now - self._last_decrease < max(self._duration_ewma, 1.0):
+                return
+            self._last_decrease = now
+            previous = self.limit
+            self.limit = max(float(self.minimum), self.limit * DECREASE_FACTOR)
+            print(f"Drive pushed back; upload concurrency {previous:.1f} -> {self.limit:.1f}")
+
+    def snapshot(self):
+        with self._condition:
+            return {"limit": round(self.limit, 2), "in_flight": self.in_flight}
+
+
+def get_upload_controller(quota_key, *, start, minimum, maximum):
+    """Return the process-wide controller for a Drive quota (one per credential)."""
+    with _CONTROLLERS_LOCK:
+        controller = _CONTROLLERS.get(quota_key)
+        if controller is None:
+            controller = _CONTROLLERS[quota_key] = AdaptiveConcurrency(start=start, minimum=minimum, maximum=maximum)
+        else:
+            controller.configure(minimum=minimum, maximum=maximum)
+        return controller
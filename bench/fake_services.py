@@ -0,0 +1,485 @@
+"""
+Local stand-ins for the Smartsheet and Google Drive REST APIs, used by bench/run_bench.py.
+They serve generated sheets (rows, comments, attachments) and accept Drive folder creates,
+uploads (multipart, resumable and batched), copies and deletes, optionally adding latency and 429s.
+ServiceProcess runs both in a child process so they do not share the benchmarked process.
+"""
+import io
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import uuid
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from openpyxl import Workbook
+
+FOLDER_ID = 1000
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+_PAYLOAD_CHUNK = b"smartsheet-bench-" * 4096
+
+
+class _Stats:
+    """Request counts per route plus bytes in and out, shared by a server's handler threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.throttled = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, route, bytes_in=0, bytes_out=0, throttled=False):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.throttled += int(throttled)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": dict(sorted(self.requests.items())),
+                "total_requests": sum(self.requests.values()),
+                "throttled": self.throttled,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+
+class SmartsheetBackend:
+    """
+    Generated Smartsheet folder: `sheets` sheets of `rows` rows each, `comments` comments per sheet
+    (in the export's Comments tab) and `attachments` row attachments of `attachment_kb` KB per sheet.
+    """
+
+    def __init__(self, *, sheets, rows, comments, attachments, attachment_kb, latency_ms=0, error_rate=0.0):
+        self.sheet_ids = [2000 + index for index in range(sheets)]
+        self.rows = rows
+        self.comments = comments
+        self.attachments = attachments
+        self.attachment_kb = attachment_kb
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.base_url = None  # set once the server is listening
+        self.stats = _Stats()
+        self._exports = {}
+        self._export_lock = threading.Lock()
+
+    # Generated data
+
+    def _row_id(self, sheet_id, row_number):
+        return sheet_id * 1_000_000 + row_number
+
+    def _attachment(self, sheet_id, index):
+        row_number = index % self.rows + 1
+        return {
+            "id": sheet_id * 1_000_000 + 500_000 + index,
+            "name": f"file_{index}.bin",
+            "attachmentType": "FILE",
+            "mimeType": "application/octet-stream",
+            "sizeInKb": self.attachment_kb,
+            "parentType": "ROW",
+            "parentId": self._row_id(sheet_id, row_number),
+            "createdAt": "2024-01-01T00:00:00Z",
+        }
+
+    def _row_attachments(self, sheet_id, row_number):
+        if not self.rows:
+            return []
+        return [
+            self._attachment(sheet_id, index)
+            for index in range(row_number - 1, self.attachments, self.rows)
+        ]
+
+    def _export(self, sheet_id):
+        with self._export_lock:
+            if sheet_id not in self._exports:
+                workbook = Workbook(write_only=True)
+                data = workbook.create_sheet(f"Sheet {sheet_id}")
+                data.append(["Task", "Owner", "Status", "Estimate"])
+                for row_number in range(1, self.rows + 1):
+                    data.append([f"Task {row_number}", f"owner{row_number % 17}@example.com", "Open", row_number % 40])
+                comments = workbook.create_sheet("Comments")
+                for index in range(self.comments):
+                    row_label = f"Row {index % max(self.rows, 1) + 1}"
+                    comments.append([row_label, f"Comment {index} on {row_label}", "reviewer@example.com", "2024-01-01"])
+                buffer = io.BytesIO()
+                workbook.save(buffer)
+                self._exports[sheet_id] = buffer.getvalue()
+            return self._exports[sheet_id]
+
+    @staticmethod
+    def _page(items, query):
+        page_size = int(query.get("pageSize", ["100"])[0])
+        page = int(query.get("page", ["1"])[0])
+        total_pages = max((len(items) + page_size - 1) // page_size, 1)
+        return {
+            "pageNumber": page,
+            "pageSize": page_size,
+            "totalPages": total_pages,
+            "totalCount": len(items),
+            "data": items[(page - 1) * page_size:page * page_size],
+        }
+
+    # Routing
+
+    def handle(self, method, path, query, headers, body):
+        if path.startswith("/files/"):
+            _, _, sheet_id, attachment_id = path.split("/")
+            return "file", 200, {"Content-Type": "application/octet-stream"}, self._file_body()
+
+        if self.error_rate and random.random() < self.error_rate:
+            error = {"errorCode": 4003, "message": "Rate limit exceeded."}
+            return "throttled", 429, {"Retry-After": "1"}, json.dumps(error).encode()
+
+        parts = [part for part in path.split("/") if part][1:]  # drop the "2.0" prefix
+        if parts[:1] == ["folders"]:
+            sheets = [
+                {"id": sheet_id, "name": f"Bench sheet {sheet_id}", "modifiedAt": "2024-01-01T00:00:00Z"}
+                for sheet_id in self.sheet_ids
+            ]
+            return "folder", 200, {}, {"id": FOLDER_ID, "name": "Benchmark", "sheets": sheets}
+
+        sheet_id = int(parts[1])
+        if len(parts) == 2 and "ms-excel" in headers.get("Accept", ""):
+            headers = {
+                "Content-Type": XLSX_MIME_TYPE,
+                "Content-Disposition": f'attachment; filename="Bench sheet {sheet_id}.xlsx";',
+            }
+            return "export", 200, headers, self._export(sheet_id)
+        if len(parts) == 2:
+            return "sheet", 200, {}, self._sheet_page(sheet_id, query)
+        if parts[2] == "version":
+            return "version", 200, {}, {"version": 1}
+        if parts[2] == "discussions":
+            return "discussions", 200, {}, self._page([], query)
+        if parts[2] == "attachments" and len(parts) == 3:
+            items = [self._attachment(sheet_id, index) for index in range(self.attachments)]
+            return "attachments", 200, {}, self._page(items, query)
+        if parts[2] == "attachments":
+            attachment_id = int(parts[3])
+            attachment = self._attachment(sheet_id, attachment_id - sheet_id * 1_000_000 - 500_000)
+            attachment["url"] = f"{self.base_url}/files/{sheet_id}/{attachment_id}"
+            attachment["urlExpiresInMillis"] = 120000
+            return "attachment", 200, {}, attachment
+        if parts[2] == "rows":
+            row_number = int(parts[3]) - self._row_id(sheet_id, 0)
+            return "row_attachments", 200, {}, self._page(self._row_attachments(sheet_id, row_number), query)
+        return "unknown", 404, {}, {"errorCode": 1006, "message": "Not Found"}
+
+    def _sheet_page(self, sheet_id, query):
+        page_size = int(query.get("pageSize", ["100"])[0])
+        page = int(query.get("page", ["1"])[0])
+        first = (page - 1) * page_size + 1
+        rows = []
+        for row_number in range(first, min(first + page_size, self.rows + 1)):
+            row = {
+                "id": self._row_id(sheet_id, row_number),
+                "rowNumber": row_number,
+                "modifiedAt": "2024-01-01T00:00:00Z",
+                "cells": [],
+            }
+            attachments = self._row_attachments(sheet_id, row_number)
+            if attachments and "attachments" in query.get("include", [""])[0]:
+                row["attachments"] = attachments
+            rows.append(row)
+        return {"id": sheet_id, "name": f"Bench sheet {sheet_id}", "totalRowCount": self.rows, "rows": rows}
+
+    def _file_body(self):
+        remaining = self.attachment_kb * 1024
+        while remaining > 0:
+            chunk = _PAYLOAD_CHUNK[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+
+
+class DriveBackend:
+    """In-memory Drive: folders and file metadata only (uploaded bytes are counted, not kept)."""
+
+    def __init__(self, *, latency_ms=0, error_rate=0.0):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.base_url = None
+        self.stats = _Stats()
+        self._lock = threading.Lock()
+        self.files = {}
+        self._uploads = {}
+
+    def add_folder(self, file_id, name, parent_id=None):
+        """Pre-create a folder with a fixed ID (the run's Drive parent and archive root)."""
+        with self._lock:
+            self.files[file_id] = {
+                "id": file_id,
+                "name": name,
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [parent_id] if parent_id else [],
+                "size": 0,
+            }
+
+    def _create(self, metadata, size=0):
+        file_id = f"bench-{uuid.uuid4().hex[:16]}"
+        parents = metadata.get("parents") or []
+        with self._lock:
+            self.files[file_id] = {
+                "id": file_id,
+                "name": metadata.get("name", "untitled"),
+                "mimeType": metadata.get("mimeType", "application/octet-stream"),
+                "parents": parents,
+                "size": size,
+            }
+        return {"id": file_id, "name": metadata.get("name")}
+
+    def count_files_under(self, folder_id):
+        """Files (not folders) anywhere below `folder_id`."""
+        with self._lock:
+            files = dict(self.files)
+
+        def is_below(item):
+            seen = set()
+            parents = list(item["parents"])
+            while parents:
+                parent_id = parents.pop()
+                if parent_id == folder_id:
+                    return True
+                if parent_id in seen or parent_id not in files:
+                    continue
+                seen.add(parent_id)
+                parents.extend(files[parent_id]["parents"])
+            return False
+
+        return sum(1 for item in files.values() if item["mimeType"] != FOLDER_MIME_TYPE and is_below(item))
+
+    def _list(self, query):
+        q = query.get("q", [""])[0]
+        name_match = re.search(r"name='((?:[^'\\]|\\.)*)'", q)
+        parent_match = re.search(r"'([^']+)' in parents", q)
+        name = name_match.group(1).replace("\\'", "'").replace("\\\\", "\\") if name_match else None
+        with self._lock:
+            files = [
+                {"id": item["id"], "name": item["name"]}
+                for item in self.files.values()
+                if (not parent_match or parent_match.group(1) in item["parents"])
+                and (name is None or item["name"] == name)
+                and ("mimeType=" not in q or item["mimeType"] == FOLDER_MIME_TYPE)
+            ]
+        return {"files": files}
+
+    def handle(self, method, path, query, headers, body):
+        if path == "/token":
+            return "token", 200, {}, {"access_token": "bench-token", "expires_in": 3600, "token_type": "Bearer"}
+        if path.startswith("/batch/"):
+            return self._batch(headers, body)
+        if path.startswith("/upload/"):
+            if self.error_rate and random.random() < self.error_rate:
+                error = {"error": {"code": 429, "message": "Rate limit", "errors": [{"reason": "rateLimitExceeded"}]}}
+                return "throttled", 429, {}, error
+            return self._upload(method, query, headers, body)
+
+        parts = [part for part in path.split("/") if part][2:]  # drop "drive/v3"
+        if parts == ["files"] and method == "GET":
+            return "files.list", 200, {}, self._list(query)
+        if parts == ["files"] and method == "POST":
+            return "files.create", 200, {}, self._create(json.loads(body or b"{}"))
+        if len(parts) == 3 and parts[2] == "copy":
+            with self._lock:
+                source = dict(self.files.get(parts[1], {}))
+            metadata = dict(source, **json.loads(body or b"{}"))
+            return "files.copy", 200, {}, self._create(metadata, source.get("size", 0))
+        if len(parts) == 2 and method == "DELETE":
+            with self._lock:
+                removed = self.files.pop(parts[1], None)
+            if removed is None:
+                return "files.delete", 404, {}, {"error": {"code": 404, "message": "File not found"}}
+            return "files.delete", 204, {}, b""
+        if len(parts) == 2 and method == "GET":
+            with self._lock:
+                item = self.files.get(parts[1])
+            if item is None:
+                return "files.get", 404, {}, {"error": {"code": 404, "message": "File not found"}}
+            return "files.get", 200, {}, item
+        return "unknown", 404, {}, {"error": {"code": 404, "message": "Not found"}}
+
+    def _upload(self, method, query, headers, body):
+        upload_type = query.get("uploadType", [""])[0]
+        upload_id = query.get("upload_id", [None])[0]
+        if method == "POST" and upload_type == "resumable":
+            upload_id = uuid.uuid4().hex
+            total = headers.get("X-Upload-Content-Length")
+            with self._lock:
+                self._uploads[upload_id] = {
+                    "metadata": json.loads(body or b"{}"),
+                    "received": 0,
+                    "total": int(total) if total else None,
+                }
+            location = f"{self.base_url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return "upload.start", 200, {"Location": location}, {}
+        if upload_id:
+            return self._upload_chunk(upload_id, headers, body)
+        if upload_type == "multipart":
+            message = message_from_bytes(
+                f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode() + body
+            )
+            metadata_part, media_part = message.get_payload()
+            metadata = json.loads(metadata_part.get_payload(decode=True) or b"{}")
+            return "upload.multipart", 200, {}, self._create(metadata, len(media_part.get_payload(decode=True) or b""))
+        return "upload.media", 200, {}, self._create({}, len(body))
+
+    def _upload_chunk(self, upload_id, headers, body):
+        content_range = headers.get("Content-Range", "")
+        match = re.match(r"bytes (\*|(\d+)-(\d+))/(\*|\d+)", content_range)
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None or not match:
+                return "upload.chunk", 404, {}, {"error": {"code": 404, "message": "Unknown upload"}}
+            if match.group(2) is not None and int(match.group(2)) == upload["received"]:
+                upload["received"] += len(body)
+            if match.group(4) != "*":
+                upload["total"] = int(match.group(4))
+            done = upload["total"] is not None and upload["received"] >= upload["total"]
+            if done:
+                del self._uploads[upload_id]
+        if done:
+            return "upload.chunk", 200, {}, self._create(upload["metadata"], upload["received"])
+        range_header = {"Range": f"bytes=0-{upload['received'] - 1}"} if upload["received"] else {}
+        return "upload.chunk", 308, range_header, b""
+
+    def _batch(self, headers, body):
+        message = message_from_bytes(f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode() + body)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload(decode=True).partition(b"\r\n")
+            if not rest:
+                request_line, _, rest = part.get_payload().encode().partition(b"\n")
+            method, target, _ = request_line.decode().split(" ", 2)
+            _, _, inner_body = rest.replace(b"\r\n", b"\n").partition(b"\n\n")
+            split = urlsplit(target)
+            _, status, _, payload = self.handle(method, split.path, parse_qs(split.query), {}, inner_body)
+            content_id = part["Content-ID"][1:-1]
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        response = "".join(parts) + f"--{boundary}--\r\n"
+        return "batch", 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, response.encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        backend = self.server.backend
+        split = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if backend.latency:
+            time.sleep(backend.latency)
+        route, status, headers, payload = backend.handle(
+            self.command, unquote(split.path), parse_qs(split.query), self.headers, body
+        )
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+            headers.setdefault("Content-Type", "application/json")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        sent = 0
+        if isinstance(payload, bytes):
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            sent = len(payload)
+        else:
+            # Generated file bodies are streamed with their known length.
+            self.send_header("Content-Length", str(backend.attachment_kb * 1024))
+            self.end_headers()
+            for chunk in payload:
+                self.wfile.write(chunk)
+                sent += len(chunk)
+        backend.stats.record(route, bytes_in=len(body), bytes_out=sent, throttled=status == 429)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+class FakeServer:
+    """Run a backend on an ephemeral localhost port in a background thread."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.backend = backend
+        backend.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-server", daemon=True)
+
+    @property
+    def url(self):
+        return self.backend.base_url
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _serve(conn, smartsheet_options, drive_options, folders):
+    """Child process body: start both stand-ins, report their URLs, then answer the parent's commands."""
+    smartsheet = SmartsheetBackend(**smartsheet_options)
+    drive = DriveBackend(**drive_options)
+    for file_id, name in folders:
+        drive.add_folder(file_id, name)
+    servers = [FakeServer(smartsheet).start(), FakeServer(drive).start()]
+    try:
+        conn.send((smartsheet.base_url, drive.base_url))
+        while True:
+            command, argument = conn.recv()
+            if command == "count_files_under":
+                conn.send(drive.count_files_under(argument))
+            elif command == "stop":
+                conn.send((smartsheet.stats.snapshot(), drive.stats.snapshot()))
+                return
+    finally:
+        for server in servers:
+            server.stop()
+
+
+class ServiceProcess:
+    """
+    Both stand-ins running in a child process, so their memory and GIL time stay out of the
+    benchmarked process's peak RSS and throughput.
+    """
+
+    def __init__(self, smartsheet_options, drive_options, folders=()):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve,
+            args=(child_conn, smartsheet_options, drive_options, list(folders)),
+            name="bench-services",
+            daemon=True,
+        )
+        self._process.start()
+        self.smartsheet_url, self.drive_url = self._conn.recv()
+
+    def count_files_under(self, folder_id):
+        self._conn.send(("count_files_under", folder_id))
+        return self._conn.recv()
+
+    def stop(self):
+        """Stop the stand-ins and return their (smartsheet, drive) request statistics."""
+        self._conn.send(("stop", None))
+        stats = self._conn.recv()
+        self._process.join(timeout=10)
+        return stats
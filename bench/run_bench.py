@@ -0,0 +1,243 @@
+"""
+Offline benchmark: runs main.run_migration end to end against the local Smartsheet and Drive
+stand-ins in bench/fake_services.py and reports throughput, peak RSS and API-call counts.
+The stand-ins run in a child process, so the figures cover the migration alone. Rates count
+only the work that completed: rows of completed sheets and attachments that reached Drive.
+
+    pip install -r bench/requirements.txt
+
+    python bench/run_bench.py --sheets 4 --rows 5000 --attachments 40 --attachment-kb 256
+    python bench/run_bench.py --latency-ms 50 --smartsheet-429-rate 0.05 --json > baseline.json
+    python bench/run_bench.py --set SHEET_EXECUTION_MODE=pool --baseline baseline.json
+
+Nothing leaves the machine: every request goes to 127.0.0.1 and all files are staged in a
+temporary work directory that is removed afterwards (use --keep-workdir to inspect it).
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "app"))
+
+import fake_services  # noqa: E402
+
+DRIVE_PARENT_FOLDER_ID = "bench-parent"
+DRIVE_ARCHIVE_ROOT_ID = "bench-archive-root"
+# Higher is better for these; the rest of the compared figures are costs.
+HIGHER_IS_BETTER = {"rows_per_second", "attachments_per_second", "mb_per_second"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets", type=int, default=3, help="sheets in the source folder")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per sheet")
+    parser.add_argument("--comments", type=int, default=200, help="comments per sheet")
+    parser.add_argument("--attachments", type=int, default=20, help="row attachments per sheet")
+    parser.add_argument("--attachment-kb", type=int, default=128, help="size of each attachment in KB")
+    parser.add_argument("--latency-ms", type=int, default=0, help="latency added to every fake API response")
+    parser.add_argument("--smartsheet-429-rate", type=float, default=0.0, help="share of Smartsheet API calls answered 429")
+    parser.add_argument("--drive-429-rate", type=float, default=0.0, help="share of Drive uploads answered 429")
+    parser.add_argument(
+        "--requests-per-minute", type=int, default=100000,
+        help="SMARTSHEET_REQUESTS_PER_MINUTE for the run (high by default so the fake server sets the pace)",
+    )
+    parser.add_argument(
+        "--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+        help="extra setting for the run, e.g. --set ATTACHMENT_TRANSFER_MODE=stream (repeatable)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the temporary work directory")
+    return parser.parse_args(argv)
+
+
+def write_service_account(path, token_uri):
+    """A throwaway service-account key whose token endpoint is the fake Drive server."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    info = {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": token_uri,
+    }
+    path.write_text(json.dumps(info), encoding="utf-8")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run(args):
+    workdir = Path(tempfile.mkdtemp(prefix="ssextractor-bench-"))
+    services = fake_services.ServiceProcess(
+        smartsheet_options={
+            "sheets": args.sheets,
+            "rows": args.rows,
+            "comments": args.comments,
+            "attachments": args.attachments,
+            "attachment_kb": args.attachment_kb,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.smartsheet_429_rate,
+        },
+        drive_options={"latency_ms": args.latency_ms, "error_rate": args.drive_429_rate},
+        folders=[(DRIVE_PARENT_FOLDER_ID, "Benchmark"), (DRIVE_ARCHIVE_ROOT_ID, "Benchmark archive")],
+    )
+    services_stats = None
+    previous_cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        service_account_file = workdir / "service_account.json"
+        write_service_account(service_account_file, f"{services.drive_url}/token")
+
+        import config
+        import main
+        import process_state
+        from ssextractor import get_or_create_drive_folder
+
+        settings = {
+            "SMARTSHEET_API_KEY": "bench-smartsheet-key",
+            "SMARTSHEET_FOLDER_ID": str(fake_services.FOLDER_ID),
+            "SMARTSHEET_API_BASE": f"{services.smartsheet_url}/2.0",
+            "SMARTSHEET_REQUESTS_PER_MINUTE": str(args.requests_per_minute),
+            "GOOGLE_API_ROOT_URL": services.drive_url,
+            "GOOGLE_AUTH_TYPE": "service_account",
+            "GOOGLE_SERVICE_ACCOUNT_FILE": str(service_account_file),
+            "GOOGLE_DRIVE_PARENT_FOLDER_ID": DRIVE_PARENT_FOLDER_ID,
+            "GOOGLE_DRIVE_ARCHIVE_ROOT_FOLDER_ID": DRIVE_ARCHIVE_ROOT_ID,
+            "SMARTSHEET_BASE_DIR": str(workdir / "data"),
+            "SHEET_MANIFEST_FILE": str(workdir / "sheet_manifest.json"),
+            "JOB_STORE_FILE": str(workdir / "job_store.db"),
+            "ARCHIVE_ROOT_SETTINGS_FILE": str(workdir / "archive_root_settings.json"),
+            "INCREMENTAL_BACKUP": "false",
+            "TEMP_DISK_MIN_FREE_MB": "0",
+        }
+        for override in args.overrides:
+            key, _, value = override.partition("=")
+            settings[key.strip()] = value.strip()
+        config.CREDENTIALS.update(settings)
+
+        job_credentials = dict(config.CREDENTIALS)
+        token = config.set_thread_credentials(job_credentials)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                for name in ("sheets", "comments", "attachments"):
+                    key = "GOOGLE_DRIVE__COMMENTS_FOLDER_ID" if name == "comments" else f"GOOGLE_DRIVE_{name.upper()}_FOLDER_ID"
+                    job_credentials[key] = get_or_create_drive_folder(name, DRIVE_PARENT_FOLDER_ID)
+        finally:
+            config.reset_thread_credentials(token)
+
+        job_id = process_state.create_job()
+        job_credentials["JOB_ID"] = job_id
+        started = time.monotonic()
+        # The migration's own progress output goes to stderr so the report (or --json) stays clean on stdout.
+        with contextlib.redirect_stdout(sys.stderr):
+            outcome = main.run_migration(job_id, job_credentials)
+        elapsed = time.monotonic() - started
+        status = process_state.get_status(job_id) or {}
+        attachments = services.count_files_under(job_credentials["GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID"])
+        services_stats = services.stop()
+    finally:
+        os.chdir(previous_cwd)
+        if services_stats is None:
+            services.stop()
+        if args.keep_workdir:
+            print(f"Work directory kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    smartsheet_stats, drive_stats = services_stats
+    sheet_states = {
+        state: sum(1 for result in status.get("sheets", {}).values() if result["state"] == state)
+        for state in ("completed", "failed", "cancelled", "skipped")
+    }
+    rows = sheet_states["completed"] * args.rows
+    transferred_mb = (smartsheet_stats["bytes_out"] + drive_stats["bytes_in"]) / (1024 * 1024)
+    return {
+        "scenario": {
+            key: value for key, value in vars(args).items() if key not in ("json", "baseline", "keep_workdir")
+        },
+        "outcome": outcome,
+        "sheets": sheet_states,
+        "rows_completed": rows,
+        "attachments_uploaded": attachments,
+        "elapsed_seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 1),
+        "attachments_per_second": round(attachments / elapsed, 2),
+        "mb_per_second": round(transferred_mb / elapsed, 2),
+        "transferred_mb": round(transferred_mb, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "smartsheet_api_calls": smartsheet_stats["total_requests"],
+        "drive_api_calls": drive_stats["total_requests"],
+        "injected_429s": smartsheet_stats["throttled"] + drive_stats["throttled"],
+        "smartsheet_requests": smartsheet_stats["requests"],
+        "drive_requests": drive_stats["requests"],
+    }
+
+
+def compare(report, baseline):
+    """Per-figure change against a baseline report, in percent (positive means better)."""
+    changes = {}
+    for key in ("elapsed_seconds", "rows_per_second", "attachments_per_second", "mb_per_second",
+                "peak_rss_mb", "smartsheet_api_calls", "drive_api_calls"):
+        before, after = baseline.get(key), report.get(key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        changes[key] = round(change if key in HIGHER_IS_BETTER else -change, 1)
+    return changes
+
+
+def print_report(report, changes):
+    print(f"Outcome:            {report['outcome']}")
+    print("Sheets:             " + ", ".join(f"{count} {state}" for state, count in report["sheets"].items()))
+    print(f"Elapsed:            {report['elapsed_seconds']} s")
+    print(f"Rows/s:             {report['rows_per_second']} ({report['rows_completed']} rows in completed sheets)")
+    print(f"Attachments/s:      {report['attachments_per_second']} ({report['attachments_uploaded']} uploaded)")
+    print(f"MB/s:               {report['mb_per_second']} ({report['transferred_mb']} MB transferred)")
+    print(f"Peak RSS:           {report['peak_rss_mb']} MB")
+    print(f"Smartsheet calls:   {report['smartsheet_api_calls']} {report['smartsheet_requests']}")
+    print(f"Drive calls:        {report['drive_api_calls']} {report['drive_requests']}")
+    print(f"Injected 429s:      {report['injected_429s']}")
+    if changes:
+        print("Against baseline (positive is better):")
+        for key, change in changes.items():
+            print(f"  {key:<24}{change:+.1f}%")
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    changes = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            changes = compare(report, json.load(file))
+        report["baseline_change_percent"] = changes
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, changes)
+    return 0 if not report["sheets"]["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
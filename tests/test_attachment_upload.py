@@ -0,0 +1,84 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import main
+import sheet_manifest
+import ssextractor
+
+SHEET_ID = 101
+ROW_ID = "202"
+
+
+@pytest.fixture
+def job_credentials(tmp_path):
+    credentials = dict(
+        config.CREDENTIALS,
+        SMARTSHEET_API_KEY="bench-key-123456",
+        SMARTSHEET_BASE_DIR=str(tmp_path / "tempData"),
+        JOB_ID="job-1",
+        JOB_STORE_FILE=str(tmp_path / "job_store.db"),
+        SHEET_MANIFEST_FILE=str(tmp_path / "sheet_manifest.json"),
+        GOOGLE_DRIVE_ATTACHMENTS_FOLDER_ID="attachments-root",
+    )
+    token = config.set_thread_credentials(credentials)
+    yield credentials
+    ssextractor.clear_sheet_state(SHEET_ID)
+    config.reset_thread_credentials(token)
+
+
+@pytest.fixture
+def fake_drive(monkeypatch):
+    uploaded = {}
+
+    def upload(file_path, row_folder_path, drive_row_folder_id, resolve_parent=None):
+        file_id = f"drive-{os.path.basename(file_path)}"
+        uploaded[file_id] = (drive_row_folder_id, os.path.basename(file_path))
+        return file_id
+
+    monkeypatch.setattr(ssextractor, "get_or_create_drive_folder", lambda name, parent_id: f"folder-{name}")
+    monkeypatch.setattr(
+        ssextractor,
+        "resolve_drive_folders",
+        lambda names, parent_id: {name: f"folder-{name}" for name in names},
+    )
+    monkeypatch.setattr(ssextractor, "_upload_attachment_file", upload)
+    return uploaded
+
+
+def _download(sheet_id, attachment_id, file_name):
+    """Save an attachment the way the download stage does and register it as seen this run."""
+    row_folder = os.path.join(ssextractor.attachments_folder_path(sheet_id), ROW_ID)
+    os.makedirs(row_folder, exist_ok=True)
+    file_path = os.path.join(row_folder, file_name)
+    with open(file_path, "wb") as file:
+        file.write(b"attachment body")
+    attachment = SimpleNamespace(id=attachment_id, name=file_name, size_in_kb=1)
+    state = ssextractor.get_sheet_state(sheet_id)
+    state.setdefault("attachment_files", {})[os.path.abspath(file_path)] = ssextractor._attachment_record(
+        attachment, ROW_ID
+    )
+    state.setdefault("seen_attachments", set()).add(str(attachment_id))
+
+
+def test_extensionless_attachment_reaches_drive_and_completes_sheet(job_credentials, fake_drive):
+    _download(SHEET_ID, 1, "README")
+    _download(SHEET_ID, 2, "report.pdf")
+    ssextractor.get_sheet_state(SHEET_ID)["source_version"] = {
+        "version": 7,
+        "modified_at": None,
+        "sheet_name": "Sheet",
+        "destination": "attachments-root",
+    }
+
+    uploaded = ssextractor.upload_attachments_to_drive(SHEET_ID)
+
+    assert set(uploaded) == {"README", "report.pdf"}
+    assert fake_drive["drive-README"] == (f"folder-{ROW_ID}", "README")
+    assert ssextractor.get_attachment_sync_result(SHEET_ID)[1] is True
+    assert main.record_completed_sheet(SHEET_ID) == []
+    entry = sheet_manifest.get_sheet_entry(ssextractor.get_storage_user_suffix(), SHEET_ID)
+    assert entry["last_status"] == "completed"
+    assert entry["attachments"]["1"]["drive_file_id"] == "drive-README"